@@ -36,42 +36,108 @@
 # Gabriel, Miguel Angel, David (x2), Sergio, Marta, Alba, Montse & Eloy.
 
 from fpdf import FPDF
-from time import time
-from datetime import datetime
-from os import linesep, path, remove
+from array import array
+from random import uniform
+from bisect import bisect_left
+from functools import partial
+from itertools import islice
+from time import perf_counter, sleep, time
+from fnmatch import fnmatchcase
+from datetime import datetime, timedelta
+from http.cookiejar import DefaultCookiePolicy
+from urllib.parse import parse_qsl, urlencode, urljoin, urlsplit, \
+    urlunsplit
 from colorama import Fore, Style, init
-from collections import Counter, defaultdict
+from os import getpid, linesep, listdir, mkdir, path, remove, replace
+from collections import Counter, defaultdict, deque
+from email.utils import parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from concurrent.futures import ThreadPoolExecutor
 from argparse import ArgumentParser, RawDescriptionHelpFormatter
+import io
 import re
+import ssl
+import json
+import gzip
 import sys
+import socket
+import asyncio
+import sqlite3
+import hashlib
 import requests
+import threading
+import multiprocessing
+import http.client
 import contextlib
+import contextvars
+import statistics
 import tldextract
 
 A_FILE = 'analysis_h.txt'
+ASYNC_R = 64
 BOLD_S = ("[0.", "HTTP R", "[1.", "[2.", "[3.", "[4.", "[5.", "[Cabeceras")
+BREAK_N = 3
+BREAK_T = 300
 BRI_R = Style.BRIGHT + Fore.RED
+C_COLS = {'date': 'd', 'url': 'I', 'missing': 'H', 'fingerprint': 'H',
+          'insecure': 'H', 'empty': 'H', 'total': 'H'}
+C_DIR = 'analysis_h.col'
+CACHE_F = 'analysis_h.cache'
+CACHE_N = 1000
+CACHE_T = 600
 CAN_S = ': https://caniuse.com/?search='
+CKPT_N = 500
+CKPT_S = 2
 CDN_E = [520, 521, 522, 523, 524, 525, 526, 527, 530]
 CLI_E = [400, 401, 402, 403, 405, 406, 409, 410, 411, 412, 413, 414, 415, 416,
          417, 421, 422, 423, 424, 425, 426, 428, 429, 431, 451]
+CRLF = '\r\n'
+DNS_N = 30
 F_FILE = 'fingerprint.txt'
+FLEET_N = 10
+FNG_V = r"[/ ]?v?(\d[\w.-]*)"
+GATE_S = ['missing', 'fingerprint', 'insecure', 'empty']
 GIT_U = "https://github.com/rfc-st/humble"
+H_SEG = r'analysis_h\.(\d{14})(-\d+)?\.gz'
+HDR_L = 32768
+HDR_N = 500
 INS_S = 'http:'
 IP_PTRN = (r'^(?:\d{1,3}\.){3}\d{1,3}$|'
            r'^(?:[0-9a-fA-F]{1,4}:){7}[0-9a-fA-F]{1,4}$')
+METRICS_B = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 15]
+METRICS_H = {'humble_errors_total': 'URLs not analyzed, by error',
+             'humble_fetch_seconds': 'Time to retrieve the headers of a URL',
+             'humble_findings_total': 'Warnings found, by analysis section',
+             'humble_responses_total': 'HTTP responses, by status code class',
+             'humble_scans_total': 'URLs analyzed'}
 # https://data.iana.org/TLD/tlds-alpha-by-domain.txt
 NON_RU_TLDS = ['CYMRU', 'GURU', 'PRU']
 PAT_LN = r'\[(.*?)\]'
 PRG_N = 'humble (HTTP Headers Analyzer) - '
+RATE_B = 5
+RATE_M = 120
+QUEUE_A = 3
+QUEUE_P = 1
 REF_CDN_E = ' Ref  : https://developers.cloudflare.com/support/\
 troubleshooting/cloudflare-errors/troubleshooting-cloudflare-5xx-errors/'
 REF_SRV_E = ' Ref  : https://developer.mozilla.org/en-US/docs/Web/HTTP/Status/'
 REF_E = 'Ref  :'
 REF_S = 'Ref: '
+RETRY_B = 0.5
+RETRY_M = 30
 SRV_E = [500, 501, 502, 503, 504, 505, 506, 507, 508, 510, 511]
 SEC_S = "https://"
+SNAP_F = 'analysis_h.snap'
+SNAP_N = 5000
+TRACE_N = 10000
+TREND_D = 30 * 86400
+TREND_N = 10
+TREND_W = 7
 URL_S = ' URL  : '
+WATCH_F = 10
+WATCH_V = ['age', 'cf-ray', 'content-length', 'date', 'etag', 'expires',
+           'last-modified', 'server-timing', 'x-amz-cf-id', 'x-request-id',
+           'x-runtime', 'x-served-by', 'x-timer']
 
 
 export_date = datetime.now().strftime("%Y%m%d")
@@ -99,11 +165,11 @@ class PDF(FPDF):
         self.set_font('Helvetica', 'I', 8)
         pdf.set_text_color(0, 0, 0)
         self.cell(0, 10, get_detail('[pdf_p]') + ' ' + str(self.page_no()) +
-                  get_detail('[pdf_po') + ' {nb}', align='C')
+                  get_detail('[pdf_po]') + ' {nb}', align='C')
 
 
-def pdf_metadata():
-    title = get_detail('[pdf_m]', replace=True) + ' ' + URL
+def pdf_metadata(title=None):
+    title = title or get_detail('[pdf_m]', replace=True) + ' ' + URL
     git_urlc = f"{GIT_U} (v.{version})"
     pdf.set_author(git_urlc)
     pdf.set_creation_date = now
@@ -115,17 +181,18 @@ def pdf_metadata():
     pdf.set_producer(git_urlc)
 
 
-def pdf_sections():
+def pdf_sections(level=0):
     section_dict = {'[0.': '[0section_s]', '[HTTP R': '[0headers_s]',
                     '[1.': '[1missing_s]', '[2.': '[2fingerprint_s]',
                     '[3.': '[3depinsecure_s]', '[4.': '[4empty_s]',
                     '[5.': '[5compat_s]', '[Cabeceras': '[0headers_s]'}
     if match := next((i for i in section_dict if x.startswith(i)), None):
-        pdf.start_section(get_detail(section_dict[match]))
+        pdf.start_section(get_detail(section_dict[match]), level=level)
 
 
 def pdf_links(pdfstring):
-    links = {URL_S: URL, REF_E: x.partition(REF_E)[2].strip(),
+    links = {URL_S: x.partition(URL_S)[2].strip(),
+             REF_E: x.partition(REF_E)[2].strip(),
              REF_S: x.partition(REF_S)[2].strip(),
              CAN_S: x.partition(': ')[2].strip()}
     link_h = links.get(pdfstring)
@@ -143,9 +210,172 @@ def pdf_links(pdfstring):
     pdf.cell(w=2000, h=3, txt=x[x.index(": ")+2:], align="L", link=link_h)
 
 
+class ReportWriter:
+    # Sink of the text of a report: each analysis writes into its own writer
+    # (see 'report_writer'), never into 'sys.stdout' directly.
+    enabled = True
+
+    def __init__(self, stream=None):
+        self.stream = stream
+
+    def write(self, text):
+        self.stream.write(text)
+
+    def print(self, *values, end='\n'):
+        self.write(' '.join(map(str, values)) + end)
+
+    def clean(self):
+        # Kudos to Aniket Navlur!!!: https://stackoverflow.com/a/52590238
+        self.write('\x1b[1A\x1b[2K\x1b[1A\x1b[2K\x1b[1A\x1b[2K')
+
+    def close(self):
+        pass
+
+
+class TtyWriter(ReportWriter):
+    # The terminal, through the stream wrapped by colorama (colors are reset
+    # after each line, or converted on Windows).
+    def write(self, text):
+        sys.stdout.write(text)
+
+
+class FileWriter(ReportWriter):
+    def __init__(self, name):
+        super().__init__(open(name, 'w', encoding='utf8', buffering=1 << 16))
+
+    def close(self):
+        self.stream.close()
+
+
+class MemoryWriter(ReportWriter):
+    def __init__(self):
+        super().__init__(io.StringIO())
+
+    def getvalue(self):
+        return self.stream.getvalue()
+
+
+class NullWriter(ReportWriter):
+    # Only the findings are kept: the text of the details is not even looked
+    # up in the catalog.
+    enabled = False
+
+    def write(self, text):
+        pass
+
+    def print(self, *values, end='\n'):
+        pass
+
+
+def get_writer():
+    return getattr(writers, 'writer', None) or tty_w
+
+
+@contextlib.contextmanager
+def report_writer(writer):
+    # Per thread, so that concurrent analyses do not mix their reports.
+    prev_w, writers.writer = getattr(writers, 'writer', None), writer
+    try:
+        yield writer
+    finally:
+        writers.writer = prev_w
+
+
+def print_w(*values, end='\n'):
+    get_writer().print(*values, end=end)
+
+
+def pdf_lines(lines, level=0):
+    # 'x' (the line being written) is also used by 'pdf_sections' and
+    # 'pdf_links'.
+    global x
+    links_strings = (URL_S, REF_E, REF_S, CAN_S)
+    for x in lines:
+        if '[' in x:
+            pdf_sections(level)
+        pdf.set_font(style='B' if any(s in x for s in BOLD_S) else '')
+        for string in links_strings:
+            if string in x:
+                pdf_links(string)
+        pdf.set_text_color(0, 0, 0)
+        pdf.multi_cell(197, 2.6, txt=x, align='L')
+
+
+def html_header():
+    title = get_detail('[pdf_s]')
+    return f'<!DOCTYPE HTML><html lang="en"><head><meta charset="utf-8">\
+<title>{title}</title><style>pre {{overflow-x: auto; white-space: \
+pre-wrap;white-space: -moz-pre-wrap; white-space: -pre-wrap;white-space: \
+-o-pre-wrap; word-wrap: break-word; font-size: medium;}} a {{color: blue; \
+text-decoration: none;}} .ok {{color: green;}} .header {{color: #660033;}} \
+.ko {{color: red;}} </style></head>'
+
+
+def html_lines(lines, output, headers, l_empty):
+    l_final = sorted(l_miss + l_ins + ['Pragma', 'WWW-Authenticate',
+                                       'X-Frame-Options', 'X-Robots-Tag',
+                                       'X-UA-compatible'])
+    l_fng_final = sorted(l_fng)
+    # Headers (and empty ones) are looked up by name in each line, so the
+    # time depends on the size of the report, not also on their number.
+    names_h, names_e = set(headers), {i[1:] for i in l_empty}
+    ok_s, compat_s = get_detail('[ok]'), get_detail('[bcompat_n]')
+
+    sub_d = {'ahref_f': '</a>', 'ahref_s': '<a href="', 'close_t': '">',
+             'span_ko': '<span class="ko">', 'span_h':
+             '<span class="header">', 'span_f': '</span>'}
+
+    for ln in lines:
+        if 'rfc-st' in ln:
+            output.write(f"{ln[:2]}{sub_d['ahref_s']}{ln[2:-2]}\
+                             {sub_d['close_t']}{ln[2:]}{sub_d['ahref_f']}")
+        elif ' URL  : ' in ln:
+            output.write(f"{ln[:7]}{sub_d['ahref_s']}{ln[7:]}\
+                             {sub_d['close_t']}{ln[7:]}{sub_d['ahref_f']}")
+        elif any(s in ln for s in BOLD_S):
+            output.write(f'<strong>{ln}</strong>')
+        elif ok_s in ln:
+            output.write(f'<span class="ok">{ln}{sub_d["span_f"]}')
+        elif compat_s in ln:
+            output.write(f"{sub_d['span_ko']}{ln}{sub_d['span_f']}")
+        elif ' Ref: ' in ln:
+            output.write(f"{ln[:6]}{sub_d['ahref_s']}{ln[6:]}\
+                             {sub_d['close_t']}{ln[6:]}{sub_d['ahref_f']}")
+        elif ' Ref  : ' in ln:
+            output.write(f"{ln[:6]}{sub_d['ahref_s']}{ln[8:]}\
+                             {sub_d['close_t']}{ln[6:]}{sub_d['ahref_f']}")
+        elif 'caniuse' in ln:
+            ln = f"{sub_d['span_h']}{ln[1:ln.index(': ')]}: \
+{sub_d['span_f']}{sub_d['ahref_s']}{ln[ln.index(SEC_S):]}{sub_d['close_t']}\
+{ln[ln.index(SEC_S):]}{sub_d['ahref_f']}"
+            output.write(ln)
+        else:
+            if names_h.intersection(re.findall(r'([^\s:]+): ', ln)) and \
+                    ('Date:   ' not in ln):
+                ln = ln.replace(ln[0: ln.index(":")], sub_d['span_h'] +
+                                ln[0: ln.index(":")] + sub_d['span_f'])
+            for i in l_fng_final:
+                if i in ln and not args.brief:
+                    try:
+                        idx = ln.index(' [')
+                    except ValueError:
+                        continue
+                    ln = f"{sub_d['span_ko']}{ln[:idx]}{sub_d['span_f']}\
+{ln[idx:]}"
+                elif i in ln and args.brief:
+                    ln = f"{sub_d['span_ko']}{ln}{sub_d['span_f']}"
+            for i in l_final:
+                if (i in ln) and ('"' not in ln) or ('HTTP (' in ln):
+                    ln = ln.replace(ln, sub_d['span_ko'] +
+                                    ln + sub_d['span_f'])
+            if names_e.intersection(re.findall(r'[^\s:]+', ln)):
+                ln = f"{sub_d['span_ko']}{ln}{sub_d['span_f']}"
+            output.write(ln)
+
+
 def python_ver():
     if sys.version_info < (3, 9):
-        print("")
+        print_w("")
         print_detail('[python]', 2)
         sys.exit()
 
@@ -157,20 +387,27 @@ def check_updates(version):
         remote_v = re.search(r"\d{4}-\d{2}-\d{2}", response_t).group()
         remote_v_date = datetime.strptime(remote_v, '%Y-%m-%d').date()
         if remote_v_date > version:
-            print(f"\n v.{version}{get_detail('[not_latest]')[:-1]}{remote_v})\
+            print_w(f"\n v.{version}{get_detail('[not_latest]')[:-1]}\
+{remote_v})\
                   \n{get_detail('[home]')}")
         else:
-            print(f"\n v.{version}{get_detail('[latest]')}")
+            print_w(f"\n v.{version}{get_detail('[latest]')}")
     except requests.exceptions.RequestException:
-        print(f"\n{get_detail('[update_error]')}")
+        print_w(f"\n{get_detail('[update_error]')}")
+
+
+def get_fng_lines():
+    # Only the fingerprint headers: the signatures of their values
+    # ('Header: value [Product]' lines) are not counted.
+    with open(path.join('additional', F_FILE), 'r', encoding='utf8') as fng_f:
+        return [line for line in fng_f if not
+                line.partition(' [')[0].partition(': ')[2]]
 
 
 def fng_analytics_global():
-    print(f"\n{Style.BRIGHT}{get_detail('[fng_stats]', replace=True)}\
+    print_w(f"\n{Style.BRIGHT}{get_detail('[fng_stats]', replace=True)}\
 {Style.RESET_ALL}{get_detail('[fng_source]', replace=True)}\n")
-    with open(path.join('additional', F_FILE), 'r', encoding='utf8') as fng_f:
-        fng_lines = fng_f.readlines()
-    fng_analytics_global_groups(fng_lines)
+    fng_analytics_global_groups(get_fng_lines())
 
 
 def fng_analytics_global_groups(fng_lines):
@@ -183,19 +420,18 @@ def fng_analytics_global_groups(fng_lines):
 def fng_analytics_global_print(fng_lines, content_cnt):
     max_ln_lgth = max(len(content) for content, _ in
                       content_cnt.most_common(20))
-    print(f"{get_detail('[fng_top]', replace=True)} {len(fng_lines)}\
+    print_w(f"{get_detail('[fng_top]', replace=True)} {len(fng_lines)}\
 {get_detail('[fng_top_2]', replace=True)}\n")
     for content, count in content_cnt.most_common(20):
         pct_fng_global = round(count / len(fng_lines) * 100, 2)
         padding_s = ' ' * (max_ln_lgth - len(content))
-        print(f" [{content}]: {padding_s}{pct_fng_global:.2f}% ({count})")
+        print_w(f" [{content}]: {padding_s}{pct_fng_global:.2f}% ({count})")
 
 
 def fng_analytics(term):
-    print(f"\n{Style.BRIGHT}{get_detail('[fng_stats]', replace=True)}\
+    print_w(f"\n{Style.BRIGHT}{get_detail('[fng_stats]', replace=True)}\
 {Style.RESET_ALL}{get_detail('[fng_source]', replace=True)}\n")
-    with open(path.join('additional', F_FILE), 'r', encoding='utf8') as fng_f:
-        fng_lines = fng_f.readlines()
+    fng_lines = get_fng_lines()
     fng_group, term_count = fng_analytics_groups(fng_lines, term)
     fng_analytics_content(fng_group, term, term_count, fng_lines)
 
@@ -212,31 +448,31 @@ def fng_analytics_groups(fng_ln, term):
 
 def fng_analytics_content(fng_group, term, term_count, fng_lines):
     if not fng_group:
-        print(f"{get_detail('[fng_zero]', replace=True)} '{term}'.\n\n\
+        print_w(f"{get_detail('[fng_zero]', replace=True)} '{term}'.\n\n\
 {get_detail('[fng_zero_2]', replace=True)}.\n")
     else:
         fng_ln = len(fng_lines)
         pct_fng = round(term_count / fng_ln * 100, 2)
-        print(f"{get_detail('[fng_add]', replace=True)} '{term}': {pct_fng}%\
+        print_w(f"{get_detail('[fng_add]', replace=True)} '{term}': {pct_fng}%\
  ({term_count}{get_detail('[pdf_po]', replace=True)} {fng_ln})")
         fng_analytics_sorted(fng_lines, term, fng_group)
 
 
 def fng_analytics_sorted(fng_lines, term, fng_group):
     for content in sorted(fng_group):
-        print(f"\n [{content}]")
+        print_w(f"\n [{content}]")
         for line in fng_lines:
             if term.lower() in line.lower() and content in line:
-                print(f"  {line[:line.find('[')].strip()}")
+                print_w(f"  {line[:line.find('[')].strip()}")
 
 
 def print_guides():
-    print("")
+    print_w("")
     print_detail('[guides]')
     with open(path.join('additional', 'guides.txt'), 'r', encoding='utf8') as \
             gd:
         for line in gd:
-            print(f" {Style.BRIGHT}{line}" if line.startswith('[') else f"  \
+            print_w(f" {Style.BRIGHT}{line}" if line.startswith('[') else f"  \
 {line}", end='')
 
 
@@ -248,25 +484,30 @@ def get_details_lines():
 
 
 def analysis_time():
-    print(".:")
-    print("")
+    print_w(".:")
+    print_w("")
     print_detail_l('[analysis_time]')
-    print(round(end - start, 2), end="")
+    print_w(round(end - start, 2), end="")
     print_detail_l('[analysis_time_sec]')
     t_cnt = m_cnt + f_cnt + i_cnt[0] + e_cnt
     mh_cnt, fh_cnt, ih_cnt, eh_cnt, th_cnt = save_extract_totals(t_cnt)
     mhr_cnt, fhr_cnt, ihr_cnt, ehr_cnt,\
         thr_cnt = compare_totals(mh_cnt, m_cnt, fh_cnt, f_cnt, ih_cnt, i_cnt,
                                  eh_cnt, e_cnt, th_cnt, t_cnt)
-    print("")
+    print_w("")
     analysis_detail(mhr_cnt, fhr_cnt, ihr_cnt, ehr_cnt, t_cnt, thr_cnt)
 
 
 def save_extract_totals(t_cnt):
     with open(A_FILE, 'a+', encoding='utf8') as a_history, \
          open(A_FILE, 'r', encoding='utf8') as c_history:
-        a_history.write(f"{now} ; {URL} ; {m_cnt} ; {f_cnt} ; {i_cnt[0]} ; \
-{e_cnt} ; {t_cnt}\n")
+        # A cached response was already saved when it was analyzed.
+        if not cached:
+            a_history.write(f"{now} ; {URL} ; {m_cnt} ; {f_cnt} ; \
+{i_cnt[0]} ; {e_cnt} ; {t_cnt}\n")
+            store = SnapshotStore()
+            store.add(now, URL, headers)
+            store.close()
         url_ln = [line for line in c_history if URL in line]
         if not url_ln:
             return ("First",) * 5
@@ -296,28 +537,422 @@ def compare_totals(mh_cnt, m_cnt, fh_cnt, f_cnt, ih_cnt, i_cnt, eh_cnt, e_cnt,
 def file_exists(filepath):
     if not path.exists(filepath):
         detail = '[no_analysis]' if args.URL else '[no_global_analysis]'
-        print(f"\n{get_detail(detail).strip()}\n")
+        print_w(f"\n{get_detail(detail).strip()}\n")
         sys.exit()
 
 
 def url_analytics(is_global=False):
     file_exists(A_FILE)
-    with open(A_FILE, 'r', encoding='utf8') as c_history:
-        analysis_stats = extract_global_metrics(c_history) if is_global else \
-            extract_metrics(c_history)
+    filters = ' '.join(f"--{opt} {value}" for opt, value in
+                       (('glob', args.glob), ('domain', args.domain),
+                        ('since', args.since), ('until', args.until)) if value)
+    c_history = history_filtered() if filters else history_lines()
+    if filters and not c_history:
+        print_w(f"\n{get_detail('[no_filtered_analysis]').strip()}\n")
+        sys.exit()
+    analysis_stats = extract_global_metrics(c_history) if is_global else \
+        extract_metrics(c_history)
     stats_s = '[global_stats_analysis]' if is_global else '[stats_analysis]'
-    print(f"\n{get_detail(stats_s, replace=True)} {'' if is_global else URL}\
-\n")
+    if filters and is_global:
+        stats_s = '[filtered_stats_analysis]'
+    print_analytics(stats_s, analysis_stats, is_global, filters)
+
+
+def print_analytics(stats_s, analysis_stats, is_global, filters=''):
+    filters = f" ({filters})" if filters and not is_global else filters
+    print_w(f"\n{get_detail(stats_s, replace=True)} {'' if is_global else URL}\
+{filters}\n")
     for key, value in analysis_stats.items():
         key = f"{Style.BRIGHT}{key}{Style.RESET_ALL}" \
             if (not value or not key.startswith(' ')) else key
-        print(f"{key}: {value}")
+        print_w(f"{key}: {value}")
+
+
+def print_section(title, rows):
+    # Printed apart from 'print_analytics()', as the same name (e.g. of a
+    # header) can be in several sections of a report.
+    print_w(f"{Style.BRIGHT}{title}{Style.RESET_ALL}: ")
+    for name, value in rows:
+        print_w(f" {name}: {value}")
+
+
+def history_segments():
+    # Compressed segments rotated by '--compact', oldest first (named after
+    # their newest analysis).
+    segs = (re.fullmatch(H_SEG, name) for name in listdir('.'))
+    return [seg.string for seg in sorted(
+        (seg for seg in segs if seg),
+        key=lambda seg: (seg[1], int(seg[2][1:]) if seg[2] else 0))]
+
+
+def history_lines():
+    # The whole history: the archived segments and then 'A_FILE', streamed.
+    for seg_name in history_segments():
+        with gzip.open(seg_name, 'rt', encoding='utf8') as seg_f:
+            yield from seg_f
+    with open(A_FILE, 'r', encoding='utf8') as a_history:
+        yield from a_history
+
+
+def history_filtered():
+    # Analyses of '-a' matching '--glob', '--domain', '--since' and '--until'
+    # (and '-u URL'), from the columnar history: each URL is matched once and
+    # only the rows of the matching ones, in the dates indicated, are read.
+    since_t = get_date(args.since, '--since') if args.since else 0
+    until_t = get_date(args.until, '--until', 1) if args.until else \
+        float('inf')
+    domain = get_domain(f"//{args.domain.lower()}") if args.domain else ''
+    cols, urls = history_columns()
+    order, starts = history_index(cols, urls)
+    c_history = []
+    for url_n, url in enumerate(urls):
+        if not history_match(url, domain):
+            continue
+        low = history_bisect(cols['date'], order, since_t, starts[url_n],
+                             starts[url_n + 1])
+        high = history_bisect(cols['date'], order, until_t, low,
+                              starts[url_n + 1])
+        for row_n in order[low:high]:
+            date_r = datetime.fromtimestamp(cols['date'][row_n])
+            counts = ' ; '.join(str(cols[col][row_n]) for col in
+                                list(C_COLS)[2:])
+            c_history.append(f"{date_r:%Y/%m/%d - %H:%M:%S} ; {url} ; \
+{counts}")
+    # In the order of the history, as without filters.
+    return sorted(c_history, key=lambda line: line[:21])
+
+
+def history_match(url, domain):
+    # Globs without a scheme are matched against the host (e.g.
+    # '*.example.com'); the whole URL otherwise.
+    if URL and URL not in url:
+        return False
+    if domain and get_domain(url).lower() != domain:
+        return False
+    if args.glob and '://' in args.glob:
+        return fnmatchcase(url, args.glob)
+    return not args.glob or fnmatchcase((urlsplit(url).hostname or '').lower(),
+                                        args.glob.lower())
+
+
+def history_bisect(dates, order, date_t, low, high):
+    while low < high:
+        mid = (low + high) // 2
+        if dates[order[mid]] < date_t:
+            low = mid + 1
+        else:
+            high = mid
+    return low
+
+
+def get_date(date_s, option, days=0):
+    with contextlib.suppress(ValueError):
+        return (datetime.strptime(date_s.replace('-', '/'), '%Y/%m/%d') +
+                timedelta(days=days)).timestamp()
+    parser.error(f"'{option}' must be a date as YYYY/MM/DD ('{date_s}').")
+
+
+def get_compact(compact_s):
+    # E.g. 'days=30,last=10,daily,drop=365': analyses older than 30 days, or
+    # than the 10 latest of each URL, are archived (downsampled to one per
+    # URL and day), and those older than 365 days are deleted.
+    policy = {}
+    for term in (term.strip() for term in compact_s.split(',')):
+        key, sep, value = term.partition('=')
+        if sep and key in ('days', 'last', 'drop') and value.isdigit():
+            policy[key] = int(value)
+        elif term in ('daily', 'monthly'):
+            policy['sample'] = term
+        else:
+            parser.error(f"'--compact' terms must be days=N, last=N, \
+drop=N, daily or monthly ('{term}').")
+    if 'days' not in policy and 'last' not in policy:
+        parser.error("'--compact' policy must include days=N or last=N.")
+    return policy
+
+
+def history_cutoff(days):
+    return datetime.fromtimestamp(time() - days * 86400).strftime(
+        "%Y/%m/%d - %H:%M:%S") if days is not None else ''
+
+
+def history_active(size_a):
+    # Lines of 'A_FILE' up to 'size_a' bytes: analyses saved meanwhile are
+    # copied as they are once the compaction is done.
+    with open(A_FILE, 'rb') as a_history:
+        for line_b in a_history:
+            size_a -= len(line_b)
+            if size_a < 0:
+                break
+            yield line_b.decode('utf8', 'replace')
+
+
+def history_compact(policy):
+    # Two passes over 'A_FILE' (the first one only counts the analyses of
+    # each URL), so memory does not grow with its size. The latest analysis
+    # of each URL is always kept, to compare the next one with it.
+    file_exists(A_FILE)
+    cut_d, cut_drop = history_cutoff(policy.get('days')), \
+        history_cutoff(policy.get('drop'))
+    size_a = path.getsize(A_FILE)
+    url_cnt = Counter(line.split(' ; ')[1] for line in history_active(size_a)
+                      if line.count(' ; ') == 6)
+    url_idx, aggs, cnts = Counter(), {}, [0, 0, 0, 0]
+    newest = ''
+    with open(f"{A_FILE}.tmp", 'w', encoding='utf8', newline='') as a_tmp, \
+            gzip.open(f"{A_FILE}.gz.tmp", 'wt', encoding='utf8') as seg_f:
+        for line in history_active(size_a):
+            fields = line.split(' ; ')
+            if len(fields) != 7:
+                a_tmp.write(line)
+                continue
+            url_idx[fields[1]] += 1
+            left = url_cnt[fields[1]] - url_idx[fields[1]]
+            if not left or not (fields[0] < cut_d or left >=
+                                policy.get('last', left + 1)):
+                a_tmp.write(line)
+                cnts[0] += 1
+            elif fields[0] < cut_drop:
+                cnts[2] += 1
+            elif policy.get('sample'):
+                history_sample(aggs, fields, policy['sample'])
+                cnts[1] += 1
+            else:
+                seg_f.write(line)
+                newest = max(newest, fields[0])
+                cnts[1] += 1
+        for (date_h, url), sums in sorted(aggs.items()):
+            avgs = [str(round(cnt / sums[0])) for cnt in sums[1:]]
+            seg_f.write(f"{date_h} ; {url} ; {' ; '.join(avgs)}\n")
+            newest = max(newest, date_h)
+    with open(A_FILE, 'rb') as a_history, open(f"{A_FILE}.tmp", 'ab') as a_tmp:
+        a_history.seek(size_a)
+        a_tmp.write(a_history.read())
+    replace(f"{A_FILE}.tmp", A_FILE)
+    history_rotate(newest, cut_drop, cnts)
+    if cut_drop and path.exists(SNAP_F):
+        snap_prune(cut_drop)
+    # The columnar copy ('C_DIR') is rebuilt the next time it is used.
+    with contextlib.suppress(OSError):
+        remove(path.join(C_DIR, 'meta.json'))
+    print_analytics('[compact_history]', {get_detail(key, replace=True): cnt
+                                          for key, cnt in
+                                          zip(('[compact_active]',
+                                               '[compact_archived]',
+                                               '[compact_dropped]',
+                                               '[compact_segments]'), cnts)},
+                    True)
+
+
+def history_sample(aggs, fields, sample):
+    # Average warnings of each URL per day (or month).
+    date_h = f"{fields[0][:10]} - 00:00:00" if sample == 'daily' else \
+        f"{fields[0][:7]}/01 - 00:00:00"
+    sums = aggs.setdefault((date_h, fields[1]), [0] * 6)
+    sums[0] += 1
+    for cnt_n, cnt in enumerate(fields[2:], 1):
+        sums[cnt_n] += int(cnt)
+
+
+def history_rotate(newest, cut_drop, cnts):
+    seg_tmp = f"{A_FILE}.gz.tmp"
+    if not newest:
+        remove(seg_tmp)
+    else:
+        stamp, seg_n = re.sub(r'\D', '', newest), 1
+        seg_name = f"analysis_h.{stamp}.gz"
+        while path.exists(seg_name):
+            seg_name = f"analysis_h.{stamp}-{seg_n}.gz"
+            seg_n += 1
+        replace(seg_tmp, seg_name)
+    for seg_name in history_segments():
+        if re.fullmatch(H_SEG, seg_name)[1] < re.sub(r'\D', '', cut_drop):
+            remove(seg_name)
+            cnts[3] += 1
+
+
+class SnapshotStore:
+    # Headers of the analyses saved to the history, for '--reanalyze'. Each
+    # distinct set of headers is stored once (compressed, keyed by its hash)
+    # without the values that change on every response (see 'WATCH_V', and
+    # cookies), which are kept along with the date and URL of each analysis.
+    def __init__(self):
+        self.conn = snap_open()
+        self.rows, self.blobs, self.flush_t = [], {}, time()
+
+    def add(self, date_h, url, headers):
+        stable, values = snap_split(headers)
+        hash_n = hashlib.sha256(stable.encode()).hexdigest()
+        self.blobs[hash_n] = stable
+        self.rows.append((date_h, url, hash_n, values))
+        if len(self.rows) >= CKPT_N or time() - self.flush_t >= CKPT_S:
+            self.flush()
+
+    def flush(self):
+        # Only the sets of headers not stored yet are compressed.
+        if self.rows:
+            marks = ', '.join('?' * len(self.blobs))
+            with self.conn:
+                known = {row[0] for row in self.conn.execute(
+                    f"SELECT hash FROM snapshots WHERE hash IN ({marks})",
+                    list(self.blobs))}
+                self.conn.executemany("INSERT INTO snapshots VALUES (?, ?)",
+                                      ((hash_n, gzip.compress(stable.encode(
+                                          ))) for hash_n, stable in
+                                       self.blobs.items() if hash_n not in
+                                       known))
+                self.conn.executemany("INSERT OR REPLACE INTO scans VALUES \
+(?, ?, ?, ?)", self.rows)
+        self.rows, self.blobs, self.flush_t = [], {}, time()
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+
+def snap_open():
+    conn = sqlite3.connect(SNAP_F)
+    conn.execute("CREATE TABLE IF NOT EXISTS snapshots (hash TEXT PRIMARY \
+KEY, headers BLOB)")
+    conn.execute("CREATE TABLE IF NOT EXISTS scans (date TEXT, url TEXT, hash \
+TEXT, vals TEXT, PRIMARY KEY (date, url))")
+    conn.execute("CREATE INDEX IF NOT EXISTS scans_hash ON scans (hash)")
+    return conn
+
+
+def snap_split(headers):
+    # The headers (in order, with None instead of the values left out) and
+    # the values left out, as JSON. The value of each cookie is masked (e.g.
+    # 'sid=*; Path=/; Secure'), as only its attributes are analyzed.
+    l_stable, l_values = [], []
+    for key, value in headers.items():
+        if key.lower() == 'set-cookie':
+            l_stable.append([key, None])
+            l_values.append(re.sub(r'(^|,\s*)([^=;,\s]+)=[^;,]*', r'\1\2=*',
+                                   value))
+        elif key.lower() in WATCH_V:
+            l_stable.append([key, None])
+            l_values.append(value)
+        else:
+            l_stable.append([key, value])
+    return json.dumps(l_stable), json.dumps(l_values)
+
+
+def snap_join(stable, values):
+    values = iter(json.loads(values))
+    return requests.structures.CaseInsensitiveDict(
+        (key, next(values) if value is None else value) for key, value in
+        json.loads(stable))
+
+
+def snap_prune(cut_drop):
+    # Along with the analyses deleted by '--compact'; the headers no longer
+    # referenced by any analysis are deleted too.
+    conn = snap_open()
+    with conn:
+        conn.execute("DELETE FROM scans WHERE date < ?", (cut_drop,))
+        conn.execute("DELETE FROM snapshots WHERE hash NOT IN (SELECT hash \
+FROM scans)")
+    conn.close()
+
+
+def history_reanalyze():
+    # The analyses of the history whose headers were stored are performed
+    # again with the current rules (in parallel, SNAP_N at a time) and their
+    # counts rewritten, in the archived segments and in 'A_FILE'.
+    file_exists(A_FILE)
+    if not path.exists(SNAP_F):
+        print_w(f"\n{get_detail('[no_snapshots]').strip()}\n")
+        sys.exit()
+    conn, cnts = snap_open(), [0, 0, 0]
+    pool = reanalyze_pool()
+    try:
+        for seg_name in history_segments():
+            changed_n = cnts[2]
+            with gzip.open(seg_name, 'rt', encoding='utf8') as seg_f, \
+                    gzip.open(f"{seg_name}.tmp", 'wt', encoding='utf8') as \
+                    seg_tmp:
+                seg_tmp.writelines(reanalyze_lines(conn, pool, seg_f, cnts))
+            if cnts[2] > changed_n:
+                replace(f"{seg_name}.tmp", seg_name)
+            else:
+                remove(f"{seg_name}.tmp")
+        # Analyses saved meanwhile are copied as they are, as '--compact'.
+        size_a = path.getsize(A_FILE)
+        with open(f"{A_FILE}.tmp", 'w', encoding='utf8', newline='') as \
+                a_tmp:
+            a_tmp.writelines(reanalyze_lines(conn, pool, history_active(
+                size_a), cnts))
+        with open(A_FILE, 'rb') as a_history, \
+                open(f"{A_FILE}.tmp", 'ab') as a_tmp:
+            a_history.seek(size_a)
+            a_tmp.write(a_history.read())
+        replace(f"{A_FILE}.tmp", A_FILE)
+    finally:
+        if pool:
+            pool.terminate()
+        conn.close()
+    with contextlib.suppress(OSError):
+        remove(path.join(C_DIR, 'meta.json'))
+    print_analytics('[reanalyze_history]', {get_detail(key, replace=True): cnt
+                                            for key, cnt in
+                                            zip(('[reanalyze_analyses]',
+                                                 '[reanalyze_snapshots]',
+                                                 '[reanalyze_changed]'),
+                                                cnts)}, True)
+
+
+def reanalyze_pool():
+    # 'fork' keeps the state already loaded (rules, catalogs), as 'spawn'
+    # would run humble again in each process; without it, the analyses are
+    # performed one at a time.
+    with contextlib.suppress(ValueError):
+        return multiprocessing.get_context('fork').Pool()
+    return None
+
+
+def reanalyze_lines(conn, pool, lines, cnts):
+    # The headers are read here (the processes only decompress and analyze
+    # them), and the lines are yielded in the same order.
+    chunk = list(islice(lines, SNAP_N))
+    while chunk:
+        items, l_idx = [], []
+        for line_n, line in enumerate(chunk):
+            fields = line.rstrip('\n').split(' ; ')
+            if len(fields) != 7:
+                continue
+            cnts[0] += 1
+            if row := conn.execute("SELECT snapshots.headers, scans.vals FROM \
+scans JOIN snapshots ON snapshots.hash = scans.hash WHERE scans.date = ? AND \
+scans.url = ?", fields[:2]).fetchone():
+                items.append((fields[0], fields[1], *row))
+                l_idx.append(line_n)
+        for line_n, line in zip(l_idx, pool.map(reanalyze_line, items) if
+                                pool else map(reanalyze_line, items)):
+            cnts[1] += 1
+            # Kept as it is if the analysis fails now.
+            if line:
+                cnts[2] += line != chunk[line_n]
+                chunk[line_n] = line
+        yield from chunk
+        chunk = list(islice(lines, SNAP_N))
+
+
+def reanalyze_line(item):
+    date_h, url, blob, values = item
+    headers = snap_join(gzip.decompress(blob).decode(), values)
+    result = target_analysis(url, (headers, None, None))
+    if result.error:
+        return None
+    counts = result.counts
+    return f"{date_h} ; {url} ; {' ; '.join(map(str, counts))} ; \
+{sum(counts)}\n"
 
 
 def extract_metrics(c_history):
     url_ln = [line for line in c_history if URL in line]
     if not url_ln:
-        print(f"\n{get_detail('[no_analysis]').strip()}\n")
+        print_w(f"\n{get_detail('[no_analysis]').strip()}\n")
         sys.exit()
     total_a = len(url_ln)
     first_m = extract_first_metrics(url_ln)
@@ -471,7 +1106,7 @@ def get_analysis_year_metrics(additional_m):
 def extract_global_metrics(c_history):
     url_ln = list(c_history)
     if not url_ln:
-        print(f"\n{get_detail('[no_global_analysis]').strip()}\n")
+        print_w(f"\n{get_detail('[no_global_analysis]').strip()}\n")
         sys.exit()
     total_a = len(url_ln)
     first_m = extract_global_first_metrics(url_ln)
@@ -528,15 +1163,258 @@ def print_global_metrics(total_a, first_m, second_m, third_m, additional_m):
             totals_m.items()}
 
 
+def history_columns():
+    # Columnar copy of the history ('C_DIR'): one file per column plus the
+    # URLs, updated only with the lines added to 'A_FILE' since the last time.
+    meta = {'offset': 0, 'rows': 0}
+    with contextlib.suppress(OSError, ValueError):
+        with open(path.join(C_DIR, 'meta.json'), encoding='utf8') as m_file:
+            meta = json.load(m_file)
+    cols = {col: array(c_type) for col, c_type in C_COLS.items()}
+    urls = []
+    if 0 < meta['offset'] <= path.getsize(A_FILE):
+        for col in cols:
+            with open(path.join(C_DIR, f"{col}.bin"), 'rb') as c_file:
+                cols[col].frombytes(c_file.read())
+        with open(path.join(C_DIR, 'urls.txt'), encoding='utf8') as u_file:
+            urls = u_file.read().splitlines()
+    if any(len(col) != meta['rows'] for col in cols.values()):
+        # Interrupted update, or the history has been rewritten: rebuilt.
+        meta = {'offset': 0, 'rows': 0}
+        cols = {col: array(c_type) for col, c_type in C_COLS.items()}
+        urls = []
+    url_ids = {url: url_n for url_n, url in enumerate(urls)}
+    urls_n = len(urls)
+    new_cols = {col: array(c_type) for col, c_type in C_COLS.items()}
+    if meta['offset'] == 0:
+        # Rebuilt (also after '--compact'): the archived segments first.
+        for seg_name in history_segments():
+            with gzip.open(seg_name, 'rt', encoding='utf8') as seg_f:
+                for line in seg_f:
+                    history_row(line.rstrip('\n'), new_cols, url_ids, urls)
+    with open(A_FILE, 'rb') as a_history:
+        a_history.seek(meta['offset'])
+        lines_b = a_history.read()
+    lines_b = lines_b[:lines_b.rfind(b'\n') + 1]
+    for line in lines_b.decode('utf8', 'replace').splitlines():
+        history_row(line, new_cols, url_ids, urls)
+    if meta['offset'] == 0 or lines_b:
+        history_save(new_cols, urls[urls_n:], meta['offset'] == 0)
+        meta = {'offset': meta['offset'] + len(lines_b),
+                'rows': meta['rows'] + len(new_cols['date'])}
+        with open(path.join(C_DIR, 'meta.json'), 'w',
+                  encoding='utf8') as m_file:
+            json.dump(meta, m_file)
+    for col, values in new_cols.items():
+        cols[col].extend(values)
+    return cols, urls
+
+
+def history_row(line, new_cols, url_ids, urls):
+    fields = line.split(' ; ')
+    if len(fields) != 7:
+        return
+    date_h = fields[0]
+    with contextlib.suppress(ValueError):
+        date_t = datetime(int(date_h[:4]), int(date_h[5:7]),
+                          int(date_h[8:10]), int(date_h[13:15]),
+                          int(date_h[16:18]), int(date_h[19:21])).timestamp()
+        counts = [int(cnt) for cnt in fields[2:]]
+        if (url_n := url_ids.get(fields[1])) is None:
+            url_n = url_ids[fields[1]] = len(urls)
+            urls.append(fields[1])
+        new_cols['date'].append(date_t)
+        new_cols['url'].append(url_n)
+        for col, cnt in zip(list(C_COLS)[2:], counts):
+            new_cols[col].append(cnt)
+
+
+def history_save(new_cols, new_urls, rebuild):
+    mode = 'wb' if rebuild else 'ab'
+    if not path.isdir(C_DIR):
+        mkdir(C_DIR)
+    if rebuild:
+        for name in ('order.bin', 'starts.bin'):
+            with contextlib.suppress(OSError):
+                remove(path.join(C_DIR, name))
+    for col, values in new_cols.items():
+        with open(path.join(C_DIR, f"{col}.bin"), mode) as c_file:
+            values.tofile(c_file)
+    with open(path.join(C_DIR, 'urls.txt'), mode[0], encoding='utf8') as \
+            u_file:
+        u_file.writelines(f"{url}\n" for url in new_urls)
+
+
+def history_index(cols, urls):
+    # Rows of the columnar history sorted by URL and date ('order.bin'), and
+    # where those of each URL start ('starts.bin'), for the filters of '-a':
+    # the rows added since the last time are merged into it.
+    order, starts = array('I'), array('I')
+    with contextlib.suppress(OSError, ValueError):
+        with open(path.join(C_DIR, 'order.bin'), 'rb') as o_file:
+            order.frombytes(o_file.read())
+        with open(path.join(C_DIR, 'starts.bin'), 'rb') as s_file:
+            starts.frombytes(s_file.read())
+    if not starts or starts[-1] != len(order) or len(starts) > len(urls) + 1 \
+            or len(order) > len(cols['date']):
+        # Interrupted update: rebuilt.
+        order, starts = array('I'), array('I', [0])
+    if len(order) == len(cols['date']) and len(starts) == len(urls) + 1:
+        return order, starts
+    new_rows = defaultdict(list)
+    for row_n in range(len(order), len(cols['date'])):
+        new_rows[cols['url'][row_n]].append(row_n)
+    new_order, new_starts = array('I'), array('I', [0])
+    for url_n in range(len(urls)):
+        rows = order[starts[url_n]:starts[url_n + 1]] if url_n + 1 < \
+            len(starts) else array('I')
+        if url_n in new_rows:
+            # Nearly sorted already: Timsort merges them in linear time.
+            rows = sorted(rows.tolist() + new_rows[url_n],
+                          key=cols['date'].__getitem__)
+        new_order.extend(rows)
+        new_starts.append(len(new_order))
+    with open(path.join(C_DIR, 'order.bin'), 'wb') as o_file:
+        new_order.tofile(o_file)
+    with open(path.join(C_DIR, 'starts.bin'), 'wb') as s_file:
+        new_starts.tofile(s_file)
+    return new_order, new_starts
+
+
+def history_groups(cols, urls):
+    # Rows of each URL (only those of '-u URL' if indicated), by date.
+    groups = defaultdict(list)
+    url_s = urls.index(URL) if URL in urls else -1
+    for row_n, url_n in enumerate(cols['url']):
+        if not URL or url_n == url_s:
+            groups[url_n].append(row_n)
+    for rows in groups.values():
+        rows.sort(key=cols['date'].__getitem__)
+    return groups
+
+
+def trend_percentiles(values):
+    if len(values) < 2:
+        return f"{values[0]} / {values[0]} / {values[0]}"
+    pct = statistics.quantiles(values, n=100, method='inclusive')
+    return f"{pct[49]:g} / {pct[89]:g} / {pct[98]:g}"
+
+
+def trend_slope(dates, values):
+    # Least squares: warnings per 30 days.
+    if len(dates) < 2 or max(dates) == min(dates):
+        return 0
+    avg_d, avg_v = sum(dates) / len(dates), sum(values) / len(values)
+    var_d = sum((date_t - avg_d) ** 2 for date_t in dates)
+    cov_dv = sum((date_t - avg_d) * (value - avg_v) for date_t, value in
+                 zip(dates, values))
+    return cov_dv / var_d * TREND_D
+
+
+def trend_rolling(values, window_s=TREND_W):
+    rolling_v, window_t = [], 0
+    for value_n, value in enumerate(values):
+        window_t += value - (values[value_n - window_s] if value_n >=
+                             window_s else 0)
+        rolling_v.append(round(window_t / min(value_n + 1, window_s), 1))
+    return rolling_v
+
+
+def trend_analytics():
+    file_exists(A_FILE)
+    cols, urls = history_columns()
+    groups = history_groups(cols, urls)
+    if not groups:
+        print_w(f"\n{get_detail('[no_analysis]').strip()}\n")
+        sys.exit()
+    rows = [row_n for url_rows in groups.values() for row_n in url_rows]
+    labels = [print_detail_l(f'[{label}]', analytics=True).rstrip() for
+              label in ('miss_cnt', 'finger_cnt', 'ins_cnt', 'empty_cnt',
+                        'total_cnt')]
+    trends = {get_detail(key, replace=True): value for key, value in
+              {'[main]': "", '[total_analysis]': len(rows),
+               '[trend_urls]': f"{len(groups)}\n", '[trend_pct]': ""}.items()}
+    trends.update({label: trend_percentiles([cols[col][row_n] for row_n in
+                                             rows])
+                   for label, col in zip(labels, list(C_COLS)[2:])})
+    trends[labels[-1]] += "\n"
+    if URL:
+        trends.update(trend_url(cols, rows))
+    else:
+        trends.update(trend_global(cols, urls, groups, rows))
+    print_analytics('[trend_analysis]' if URL else '[global_trend_analysis]',
+                    trends, not URL)
+
+
+def trend_url(cols, rows):
+    dates = [cols['date'][row_n] for row_n in rows]
+    totals = [cols['total'][row_n] for row_n in rows]
+    trends = {get_detail('[trend_slope]', replace=True):
+              f"{trend_slope(dates, totals):+.2f}\n",
+              get_detail('[trend_rolling]', replace=True): ""}
+    missing = trend_rolling([cols['missing'][row_n] for row_n in rows])
+    insecure = trend_rolling([cols['insecure'][row_n] for row_n in rows])
+    for row_i in range(max(0, len(rows) - TREND_W), len(rows)):
+        date_r = datetime.fromtimestamp(dates[row_i])
+        trends[f" {date_r:%Y/%m/%d - %H:%M:%S}"] = \
+            f"{missing[row_i]} / {insecure[row_i]}"
+    return trends
+
+
+def trend_global(cols, urls, groups, rows):
+    months = defaultdict(lambda: [0, 0, 0])
+    for row_n in rows:
+        month = months[f"{datetime.fromtimestamp(cols['date'][row_n]):%Y/%m}"]
+        month[0] += 1
+        month[1] += cols['missing'][row_n]
+        month[2] += cols['insecure'][row_n]
+    trends = {get_detail('[trend_monthly]', replace=True): ""}
+    for month_s, (cnt, missing, insecure) in sorted(months.items()):
+        trends[f" {month_s}"] = f"{missing / cnt:.1f} / {insecure / cnt:.1f}"
+    slopes = sorted(((trend_slope([cols['date'][row_n] for row_n in url_rows],
+                                  [cols['total'][row_n] for row_n in
+                                   url_rows]), urls[url_n]) for url_n,
+                     url_rows in groups.items() if len(url_rows) > 1),
+                    reverse=True)
+    trends[f"\n{get_detail('[trend_regressions]', replace=True)}"] = ""
+    for slope, url in slopes[:TREND_N]:
+        if slope > 0:
+            trends[f" {url}"] = f"{slope:+.2f}"
+    return trends
+
+
+def history_series(series_file):
+    # Per-URL time series for dashboards (one row per analysis, with the
+    # rolling averages), from the columnar history.
+    file_exists(A_FILE)
+    cols, urls = history_columns()
+    with open(series_file, 'w', encoding='utf8') as s_file:
+        s_file.write(f"url,date,{','.join(list(C_COLS)[2:])},missing_avg,\
+insecure_avg\n")
+        for url_n, rows in history_groups(cols, urls).items():
+            missing = trend_rolling([cols['missing'][row_n] for row_n in rows])
+            insecure = trend_rolling([cols['insecure'][row_n] for row_n in
+                                      rows])
+            url_c = f'"{urls[url_n]}"' if ',' in urls[url_n] else urls[url_n]
+            for row_i, row_n in enumerate(rows):
+                date_s = datetime.fromtimestamp(cols['date'][row_n])
+                counts = ','.join(str(cols[col][row_n]) for col in
+                                  list(C_COLS)[2:])
+                s_file.write(f"{url_c},{date_s:%Y-%m-%dT%H:%M:%S},{counts},{missing[row_i]},\
+{insecure[row_i]}\n")
+    print_w("")
+    print_detail_l('[report]')
+    print_w(path.abspath(series_file))
+
+
 def csp_store_values(csp_header, l_csp_broad_s, l_csp_insecure_s, i_cnt):
-    csp_broad, csp_deprecated, csp_insecure = (set(), set(), set())
-    for directive in csp_header.split(';'):
-        csp_dir = directive.strip()
-        csp_broad.update(value for value in l_csp_broad_s if f' {value} ' in
-                         f' {csp_dir} ')
-        csp_deprecated.update(value for value in l_csp_dep if value in csp_dir)
-        csp_insecure.update(value for value in l_csp_insecure_s if value in
-                            csp_dir)
+    # One pass over the header: the broad values are whole source expressions
+    # (looked up in a set), the rest can appear anywhere.
+    csp_broad = set(l_csp_broad_s).intersection(
+        value for directive in csp_header.split(';') for value in
+        directive.strip().split(' '))
+    csp_deprecated = {value for value in l_csp_dep if value in csp_header}
+    csp_insecure = {value for value in l_csp_insecure_s if value in csp_header}
     csp_check_values(csp_broad, csp_deprecated, csp_insecure, i_cnt)
     return (i_cnt)
 
@@ -550,7 +1428,7 @@ def csp_check_values(csp_broad, csp_deprecated, csp_insecure, i_cnt):
         print_detail_r('[icsh_h]', is_red=True) if args.brief else \
             csp_print_warnings(csp_insecure, '[icsh_h]', '[icsh]', '[icsh_b]')
         if not args.brief:
-            print("")
+            print_w("")
     if csp_broad:
         print_detail_r('[icsw_h]', is_red=True) if args.brief else \
             csp_print_warnings(csp_broad, '[icsw_h]', '[icsw]', '[icsw_b]')
@@ -563,20 +1441,19 @@ def csp_print_warnings(csp_values, csp_title, csp_desc, csp_refs):
     csp_values = ' '.join(f"'{value}'" for value in csp_values)
     print_detail_r(f'{csp_title}', is_red=True)
     print_detail_l(f'{csp_desc}')
-    print(csp_values)
+    print_w(csp_values)
     print_detail(f'{csp_refs}')
 
 
 def clean_output():
-    # Kudos to Aniket Navlur!!!: https://stackoverflow.com/a/52590238
-    sys.stdout.write('\x1b[1A\x1b[2K\x1b[1A\x1b[2K\x1b[1A\x1b[2K')
+    get_writer().clean()
 
 
 def print_path(filename):
     clean_output()
-    print("")
+    print_w("")
     print_detail_l('[report]')
-    print(path.abspath(filename))
+    print_w(path.abspath(filename))
 
 
 def print_ok():
@@ -584,56 +1461,60 @@ def print_ok():
 
 
 def print_header(header):
-    print(f" {header}" if args.output else f"{BRI_R} {header}")
+    if not get_writer().enabled:
+        return
+    print_w(f" {header}" if args.output else f"{BRI_R} {header}")
 
 
 def print_header_fng(header):
+    if not get_writer().enabled:
+        return
     prefix, _, suffix = [x.strip() for x in header.partition(' [')]
     if args.output:
-        print(f" {header}")
+        print_w(f" {header}")
     elif '[' in header:
-        print(f"{BRI_R} {prefix}{Style.NORMAL}{Fore.RESET} [{suffix}")
+        print_w(f"{BRI_R} {prefix}{Style.NORMAL}{Fore.RESET} [{suffix}")
     else:
-        print(f"{BRI_R} {header}")
+        print_w(f"{BRI_R} {header}")
 
 
 def print_summary():
     if not args.output:
         clean_output()
-        print("")
+        print_w("")
         banner = '''  _                     _     _
  | |__  _   _ _ __ ___ | |__ | | ___
  | '_ \\| | | | '_ ` _ \\| '_ \\| |/ _ \\
  | | | | |_| | | | | | | |_) | |  __/
  |_| |_|\\__,_|_| |_| |_|_.__/|_|\\___|
 '''
-        print(banner)
-        print(f" ({GIT_U})")
+        print_w(banner)
+        print_w(f" ({GIT_U})")
     elif args.output != 'pdf':
-        print("")
+        print_w("")
         print_detail('[humble]', 2)
-    print(linesep.join(['']*2))
+    print_w(linesep.join(['']*2))
     print_detail_r('[0section]')
     print_detail_l('[info]')
-    print(f" {now}")
-    print(f' URL  : {URL}')
+    print_w(f" {now}")
+    print_w(f' URL  : {URL}')
     if status_code in CLI_E:
         id_mode = f"[http_{status_code}]"
         if detail := print_detail(id_mode, num_lines=0):
-            print(detail)
-        print(REF_SRV_E + str(status_code))
+            print_w(detail)
+        print_w(REF_SRV_E + str(status_code))
 
 
 def print_headers():
     if args.ret:
-        print(linesep.join(['']*2))
+        print_w(linesep.join(['']*2))
         print_detail_r('[0headers]')
         for key, value in sorted(headers.items()):
             if not args.output:
-                print(f" {Fore.CYAN}{key}:", value)
+                print_w(f" {Fore.CYAN}{key}:", value)
             else:
-                print(f" {key}:", value)
-    print('\n')
+                print_w(f" {key}:", value)
+    print_w('\n')
 
 
 def print_details(short_d, long_d, id_mode, i_cnt):
@@ -644,64 +1525,146 @@ def print_details(short_d, long_d, id_mode, i_cnt):
     return i_cnt
 
 
+def details_index():
+    # Line of each id of the catalog, built once per catalog (i.e. language)
+    # instead of scanning it on every lookup.
+    if (index := details_i.get(id(details_f))) is None:
+        index = details_i[id(details_f)] = (details_f, {})
+        for i, line in enumerate(details_f):
+            if line.startswith('['):
+                index[1].setdefault(line.rstrip('\n'), i)
+    return index[1]
+
+
 def print_detail(id_mode, num_lines=1):
-    idx = details_f.index(id_mode + '\n')
-    print(details_f[idx+1], end='')
+    # The catalog is not even looked up if the output is discarded.
+    if not get_writer().enabled:
+        return
+    idx = details_index()[id_mode]
+    print_w(details_f[idx+1], end='')
     for i in range(1, num_lines+1):
         if idx+i+1 < len(details_f):
-            print(details_f[idx+i+1], end='')
+            print_w(details_f[idx+i+1], end='')
 
 
 def print_detail_l(id_mode, analytics=False):
-    for i, line in enumerate(details_f):
-        if line.startswith(id_mode):
-            if not analytics:
-                print(details_f[i+1].replace('\n', ''), end='')
-            else:
-                return details_f[i+1].replace('\n', '').replace(':', '')[1:]
+    if not (get_writer().enabled or analytics):
+        return
+    if (i := details_index().get(id_mode)) is None:
+        return
+    if not analytics:
+        print_w(details_f[i+1].replace('\n', ''), end='')
+    else:
+        return details_f[i+1].replace('\n', '').replace(':', '')[1:]
 
 
 def print_detail_r(id_mode, is_red=False):
+    if is_red:
+        rule_add(id_mode)
+    if not get_writer().enabled:
+        return
+    if (i := details_index().get(id_mode)) is None:
+        return
     style_str = BRI_R if is_red else Style.BRIGHT
-    for i, line in enumerate(details_f):
-        if line.startswith(id_mode):
-            if not args.output:
-                print(style_str + details_f[i+1], end='')
-            else:
-                print(details_f[i+1], end='')
-            if not is_red:
-                print("")
+    if not args.output:
+        print_w(style_str + details_f[i+1], end='')
+    else:
+        print_w(details_f[i+1], end='')
+    if not is_red:
+        print_w("")
 
 
 def get_detail(id_mode, replace=False):
-    for i, line in enumerate(details_f):
-        if line.startswith(id_mode):
-            return (details_f[i+1].replace('\n', '')) if replace else \
-                details_f[i+1]
+    if (i := details_index().get(id_mode)) is not None:
+        return (details_f[i+1].replace('\n', '')) if replace else \
+            details_f[i+1]
 
 
 def fingerprint_headers(headers, l_fng, l_fng_ex):
     f_cnt = 0
-    match_h = sorted([header for header in headers if any(elem.lower()
-                     in headers for elem in l_fng)])
     l_fng = [x.title() for x in l_fng]
-    match_h = [x.title() for x in match_h]
+    fng_s = set(l_fng)
+    match_v = fingerprint_values(headers)
+    match_h = sorted({x.title() for x in headers if x.title() in fng_s} |
+                     set(match_v))
     for header in match_h:
-        if header in l_fng:
-            get_fingerprint_detail(header, headers, l_fng, l_fng_ex, args)
-            f_cnt += 1
+        rule_add(header)
+        get_fingerprint_detail(header, headers, l_fng, l_fng_ex, args,
+                               match_v.get(header))
+        f_cnt += 1
     return f_cnt
 
 
-def get_fingerprint_detail(header, headers, l_fng, l_fng_ex, args):
+def fingerprint_values(headers):
+    # Products (and versions) revealed by the values ('Header: value [Product]'
+    # lines), matched in a single pass over each value.
+    match_v = {}
+    for header, value in headers.items():
+        if value and header.lower() in fng_values:
+            trie, l_prod = fng_values[header.lower()]
+            products = {}
+            for sig_n, ver in fingerprint_match(trie, value):
+                products[l_prod[sig_n]] = products.get(l_prod[sig_n]) or ver
+            if products:
+                match_v[header.title()] = [f"{prod} {ver}".strip() for prod,
+                                           ver in products.items()]
+    return match_v
+
+
+def fingerprint_trie(l_sig):
+    # The cost of matching a value depends on its length, not on the number of
+    # signatures; '{v}' is the (optional) version of the product, only looked
+    # for after the signatures ending with it.
+    trie = {}
+    for sig_n, sig in enumerate(l_sig):
+        node = trie
+        for char in sig.replace('{v}', '').lower():
+            node = node.setdefault(char, {})
+        node[''] = (sig_n, sig.endswith('{v}'))
+    return trie
+
+
+def fingerprint_match(trie, value):
+    # Longest signature at each start of a word, followed by its version.
+    value_l, pos = value.lower(), 0
+    while pos < len(value_l):
+        node, sig, end = trie, trie.get('') if pos == 0 else None, pos
+        for i in range(pos, len(value_l)):
+            if (node := node.get(value_l[i])) is None:
+                break
+            if '' in node and not fingerprint_word(value_l, i + 1):
+                sig, end = node[''], i + 1
+        ver = re.match(FNG_V, value[end:]) if sig and sig[1] else None
+        if sig and (ver or end > pos):
+            yield sig[0], ver[1] if ver else ''
+            pos = end + (ver.end() if ver else 0)
+        else:
+            pos += 1
+        while fingerprint_word(value_l, pos - 1) and \
+                fingerprint_word(value_l, pos):
+            pos += 1
+
+
+def fingerprint_word(value, pos):
+    return 0 <= pos < len(value) and (value[pos].isalnum() or
+                                      value[pos] in '_-')
+
+
+def get_fingerprint_detail(header, headers, l_fng, l_fng_ex, args,
+                           products=None):
     if not args.brief:
-        index_fng = l_fng.index(header)
-        print_header_fng(l_fng_ex[index_fng])
+        fng_ex = l_fng_ex[l_fng.index(header)] if header in l_fng else \
+            header
+        if products:
+            print_header_fng(f"{fng_ex.partition(' [')[0]} \
+[{', '.join(products)}]")
+        else:
+            print_header_fng(fng_ex)
         if not headers[header]:
-            print(get_detail('[empty_fng]'))
+            print_w(get_detail('[empty_fng]'))
         else:
-            print(f" {headers[header]}")
-        print("")
+            print_w(f" {headers[header]}")
+        print_w("")
     else:
         print_header(header)
 
@@ -711,9 +1674,9 @@ def analysis_detail(mhr_cnt, fhr_cnt, ihr_cnt, ehr_cnt, t_cnt, thr_cnt):
                 '[total_cnt]']
     totals = [f"{m_cnt} ({mhr_cnt})", f"{f_cnt} ({fhr_cnt})", f"{i_cnt[0]} \
 ({ihr_cnt})", f"{e_cnt} ({ehr_cnt})\n", f"{t_cnt} ({thr_cnt})\n"]
-    print("")
+    print_w("")
     for literal, total in zip(literals, totals):
-        print(f"{(print_detail_l(literal) or '')[:-1]}{total}")
+        print_w(f"{(print_detail_l(literal) or '')[:-1]}{total}")
 
 
 def parse_csp(csp_header):
@@ -731,7 +1694,7 @@ def parse_csp(csp_header):
 
 def detail_exceptions(id_exception, exception_v):
     clean_output()
-    print("")
+    print_w("")
     print_detail(id_exception)
     raise SystemExit from exception_v
 
@@ -740,11 +1703,11 @@ def print_ru_message():
     # https://github.com/rfc-st/humble/blob/master/CODE_OF_CONDUCT.md#update-20220326
     with contextlib.suppress(requests.exceptions.RequestException):
         requests.packages.urllib3.disable_warnings()
-        sffx = tldextract.extract(URL).suffix[-2:].upper()
+        sffx = tldextract.extract(URL or '').suffix[-2:].upper()
         cnty = requests.get('https://ipapi.co/country_name/', verify=False,
                             timeout=5).text.strip()
         if (sffx == 'RU' and sffx not in NON_RU_TLDS) or cnty == 'Russia':
-            print("")
+            print_w("")
             print_detail('[bcnt]', 2)
             sys.exit()
 
@@ -752,13 +1715,13 @@ def print_ru_message():
 def handle_http_error(http_code, id_mode):
     if str(http_code).startswith('5'):
         clean_output()
-        print()
+        print_w()
         if http_code in SRV_E or http_code in CDN_E:
             if detail := print_detail(id_mode, num_lines=0):
-                print(detail)
+                print_w(detail)
             else:
-                print((REF_SRV_E if http_code in SRV_E else REF_CDN_E) +
-                      str(http_code))
+                print_w((REF_SRV_E if http_code in SRV_E else REF_CDN_E) +
+                        str(http_code))
         else:
             print_detail('[e_serror]', num_lines=1)
         sys.exit()
@@ -772,7 +1735,7 @@ def request_exceptions():
         # connections. Despite this, I think 'verify=False' would benefit
         # analysis of URLs with self-signed certificates, associated with
         # development environments, etc.
-        r = requests.get(URL, verify=False, headers=c_headers, timeout=15)
+        r = get_retried(requests.get, URL, verify=False, headers=c_headers)
         status_c = r.status_code
         headers = r.headers
         r.raise_for_status()
@@ -786,10 +1749,2478 @@ def request_exceptions():
             detail_exceptions(ex, e)
     except requests.exceptions.RequestException as err:
         raise SystemExit from err
-    return headers, status_c
+    return cap_headers(headers), status_c
+
+
+def cap_headers(headers):
+    # Whatever the server sends, the time of the analysis is bounded: only the
+    # first '--max-headers' headers, and the first '--max-length' characters
+    # of their values, are analyzed.
+    if len(headers) <= args.max_headers and all(
+            len(value) <= args.max_length for value in headers.values()):
+        return headers
+    headers_c = requests.structures.CaseInsensitiveDict()
+    for key, value in list(headers.items())[:args.max_headers]:
+        headers_c[key] = value[:args.max_length]
+    return headers_c
+
+
+def get_timeouts(timeout_s):
+    # 'CONNECT[,READ]' seconds; both are the same if READ is omitted.
+    with contextlib.suppress(ValueError):
+        timeouts = tuple(float(t) for t in timeout_s.split(','))
+        if len(timeouts) in (1, 2) and min(timeouts) > 0:
+            return timeouts * (3 - len(timeouts))
+    parser.error(f"'--timeout' must be CONNECT[,READ] seconds \
+('{timeout_s}').")
+
+
+def get_timeout():
+    # Cut to the time left until the '--deadline', so no request outlasts it.
+    if not deadline_t:
+        return timeouts
+    return tuple(min(t, max(deadline_t - time(), 0.001)) for t in timeouts)
+
+
+def get_retried(get, url, **r_kwargs):
+    # Timeouts and connection errors (but not TLS ones) are retried up to
+    # '--retries' times, after a random wait of up to twice the previous one
+    # (exponential backoff with full jitter) that never exceeds '--deadline'.
+    for attempt in range(args.retries + 1):
+        start_r = perf_counter()
+        try:
+            with traced('request', 'fetch', attempt=attempt + 1):
+                r = get(url, timeout=get_timeout(), **r_kwargs)
+                # 'elapsed' is the time until the headers were received.
+                if tracer:
+                    tracer.span('headers', 'fetch', start_r, start_r +
+                                r.elapsed.total_seconds())
+            return r
+        except requests.exceptions.SSLError:
+            raise
+        except (requests.exceptions.ConnectionError,
+                requests.exceptions.Timeout):
+            wait = uniform(0, min(RETRY_M, RETRY_B * 2 ** attempt))
+            if attempt == args.retries or (deadline_t and
+                                           time() + wait >= deadline_t):
+                raise
+            sleep(wait)
+
+
+def cache_key(url):
+    # The response depends on the request headers too.
+    return hashlib.sha256(json.dumps([url, c_headers], sort_keys=True).encode(
+        )).hexdigest()
+
+
+def cache_open():
+    conn = sqlite3.connect(CACHE_F)
+    conn.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, url \
+TEXT, status INTEGER, headers TEXT, stored REAL, used REAL)")
+    return conn
+
+
+def cache_get(conn, url, ttl):
+    # 'ttl' is None when replaying: the response is used whatever its age.
+    key = cache_key(url)
+    row = conn.execute("SELECT status, headers, stored FROM cache WHERE key = \
+?", (key,)).fetchone()
+    if not row or (ttl is not None and time() - row[2] > ttl):
+        return None
+    with conn:
+        conn.execute("UPDATE cache SET used = ? WHERE key = ?", (time(), key))
+    return requests.structures.CaseInsensitiveDict(json.loads(row[1])), row[0]
+
+
+def cache_put(conn, url, headers, status_c):
+    # Only the CACHE_N most recently used responses are kept.
+    with conn:
+        conn.execute("INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?, ?, ?)",
+                     (cache_key(url), url, status_c,
+                      json.dumps(list(headers.items())), time(), time()))
+        conn.execute("DELETE FROM cache WHERE key NOT IN (SELECT key FROM \
+cache ORDER BY used DESC LIMIT ?)", (CACHE_N,))
+
+
+def cache_request():
+    # Returns the headers and status code of the response to 'URL', and
+    # whether it was cached (errors other than 4XX are not saved).
+    conn = cache_open()
+    if not args.refresh and (response := cache_get(
+            conn, URL, None if args.replay else args.cache)):
+        conn.close()
+        return *response, True
+    if args.replay:
+        clean_output()
+        print_w("")
+        print_detail('[cache_miss]')
+        sys.exit()
+    headers, status_c = request_exceptions()
+    if status_c:
+        cache_put(conn, URL, headers, status_c)
+    conn.close()
+    return headers, status_c, False
+
+
+def get_resolve(resolve_l):
+    # Same syntax as curl's '--resolve': HOST:PORT:IP (IPv6 within brackets).
+    overrides = {}
+    for resolve_v in resolve_l or []:
+        host, _, port_ip = resolve_v.partition(':')
+        port, _, ip = port_ip.partition(':')
+        if not (host and port.isdigit() and ip):
+            parser.error(f"'--resolve' must be HOST:PORT:IP ('{resolve_v}').")
+        overrides[(host.lower(), int(port))] = ip.strip('[]')
+    return overrides
+
+
+def dns_resolve(host, port):
+    # Shared by all the requests: '--resolve' overrides first, then cached
+    # lookups ('--dns-ttl'); failed lookups are also cached, for 'DNS_N'.
+    if ip := dns_overrides.get((host.lower(), port)):
+        return [ip]
+    now = time()
+    ips, expires = dns_cache.get(host, ([], 0))
+    if expires < now:
+        try:
+            with traced('dns', 'fetch', host=host):
+                l_addr = socket.getaddrinfo(host, port,
+                                            type=socket.SOCK_STREAM)
+            ips = list(dict.fromkeys(info[4][0] for info in l_addr))
+        except socket.gaierror:
+            ips = []
+        dns_cache[host] = (ips, now + (args.dns_ttl if ips else DNS_N))
+    if not ips:
+        raise socket.gaierror(socket.EAI_NONAME, f"Unable to resolve {host}")
+    return ips
+
+
+def dns_connection(address, *c_args, **c_kwargs):
+    # Replaces urllib3's 'create_connection()': only the socket goes to the
+    # resolved IP, the URL host is still used for 'Host' and TLS SNI.
+    host, port = address
+    for ip in dns_resolve(host.strip('[]'), port):
+        try:
+            with traced('connect', 'fetch', ip=ip):
+                return create_connection((ip, port), *c_args, **c_kwargs)
+        except OSError as err:
+            err_c = err
+    raise err_c
+
+
+def get_session(pool_s):
+    # Keep-alive connections reused across URLs of the same host (pools are
+    # keyed by scheme, host and port, so by IP and SNI); cookies are never
+    # sent back to the targets.
+    session = requests.Session()
+    session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+    adapter = requests.adapters.HTTPAdapter(pool_connections=100,
+                                            pool_maxsize=pool_s)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def target_exceptions(url, cond_h=None):
+    # Same as 'request_exceptions()', but returning the error (if any) instead
+    # of exiting; used when analyzing several URLs.
+    try:
+        r = get_retried(session.get, url, verify=False,
+                        headers={**c_headers, **(cond_h or {})})
+        r.raise_for_status()
+    except requests.exceptions.HTTPError as err_http:
+        http_code = err_http.response.status_code
+        if str(http_code).startswith('5'):
+            id_mode = f"[server_{http_code}]" if http_code in SRV_E or \
+                http_code in CDN_E else '[e_serror]'
+            return cap_headers(err_http.response.headers), http_code, \
+                id_mode
+        return cap_headers(err_http.response.headers), http_code, None
+    except requests.exceptions.RequestException as e:
+        if deadline_t and time() >= deadline_t:
+            return {}, None, '[e_deadline]'
+        return {}, None, exception_d.get(type(e)) or '[e_request]'
+    return cap_headers(r.headers), r.status_code, None
+
+
+async def async_exceptions(url, cond_h=None):
+    # Same as 'target_exceptions()', with the lean client of '--async'.
+    headers_r = {**requests.utils.default_headers(), **c_headers,
+                 **(cond_h or {}), 'Connection': 'close'}
+    try:
+        status_c, headers = await async_retried(url, headers_r)
+    except requests.exceptions.RequestException as e:
+        if deadline_t and time() >= deadline_t:
+            return {}, None, '[e_deadline]'
+        return {}, None, exception_d.get(type(e)) or '[e_request]'
+    if str(status_c).startswith('5'):
+        id_mode = f"[server_{status_c}]" if status_c in SRV_E or \
+            status_c in CDN_E else '[e_serror]'
+        return cap_headers(headers), status_c, id_mode
+    return cap_headers(headers), status_c, None
+
+
+async def async_retried(url, headers_r):
+    # As 'get_retried()', waiting without blocking the event loop.
+    for attempt in range(args.retries + 1):
+        try:
+            with traced('request', 'fetch', attempt=attempt + 1):
+                return await async_request(url, headers_r)
+        except requests.exceptions.SSLError:
+            raise
+        except (requests.exceptions.ConnectionError,
+                requests.exceptions.Timeout):
+            wait = uniform(0, min(RETRY_M, RETRY_B * 2 ** attempt))
+            if attempt == args.retries or (deadline_t and
+                                           time() + wait >= deadline_t):
+                raise
+            await asyncio.sleep(wait)
+
+
+async def async_request(url, headers_r):
+    # Redirects are followed, as 'requests' does.
+    for _ in range(requests.models.DEFAULT_REDIRECT_LIMIT + 1):
+        status_c, headers = await async_response(url, headers_r)
+        if status_c not in (301, 302, 303, 307, 308) or \
+                'Location' not in headers:
+            return status_c, headers
+        url = urljoin(url, headers['Location'])
+    raise requests.exceptions.TooManyRedirects(url)
+
+
+async def async_response(url, headers_r):
+    # Only the status line and the headers are read: the connection is then
+    # closed, without waiting for the body. Errors are raised as the ones of
+    # 'requests', and TLS is set up as by it ('verify=False' and the
+    # 'DEFAULT_CIPHERS' tweak).
+    url_s = urlsplit(url)
+    if url_s.scheme not in ('http', 'https'):
+        raise requests.exceptions.InvalidSchema(url) if url_s.scheme else \
+            requests.exceptions.MissingSchema(url)
+    try:
+        host = url_s.hostname.encode('idna').decode()
+        port = url_s.port or (443 if url_s.scheme == 'https' else 80)
+    except (AttributeError, UnicodeError, ValueError) as e:
+        raise requests.exceptions.InvalidURL(url) from e
+    connect_t, read_t = get_timeout()
+    try:
+        ips = await asyncio.to_thread(dns_resolve, host, port)
+        with traced('connect', 'fetch', tls=url_s.scheme == 'https'):
+            reader, writer = await asyncio.wait_for(async_connect(
+                ips, port, host if url_s.scheme == 'https' else None),
+                connect_t)
+    except asyncio.TimeoutError as e:
+        raise requests.exceptions.ConnectTimeout(url) from e
+    except ssl.SSLError as e:
+        raise requests.exceptions.SSLError(url) from e
+    except OSError as e:
+        raise requests.exceptions.ConnectionError(url) from e
+    try:
+        writer.write(async_head(url_s, host, port, headers_r))
+        with traced('headers', 'fetch'):
+            return await asyncio.wait_for(async_headers(reader), read_t)
+    except asyncio.TimeoutError as e:
+        raise requests.exceptions.ReadTimeout(url) from e
+    except (OSError, EOFError, ValueError) as e:
+        raise requests.exceptions.ConnectionError(url) from e
+    finally:
+        writer.transport.abort()
+
+
+async def async_connect(ips, port, tls_host):
+    for ip in ips:
+        try:
+            return await asyncio.open_connection(
+                ip, port, ssl=async_tls if tls_host else None,
+                server_hostname=tls_host)
+        except ssl.SSLError:
+            raise
+        except OSError as err:
+            err_c = err
+    raise err_c
+
+
+def async_head(url_s, host, port, headers_r):
+    target = requests.utils.requote_uri(urlunsplit(('', '', url_s.path or '/',
+                                                    url_s.query, '')))
+    host_h = f"[{host}]" if ':' in host else host
+    if port != (443 if url_s.scheme == 'https' else 80):
+        host_h = f"{host_h}:{port}"
+    lines = [f"GET {target} HTTP/1.1", f"Host: {host_h}"] + \
+        [f"{key}: {value}" for key, value in headers_r.items()]
+    return f"{CRLF.join(lines)}{CRLF}{CRLF}".encode('latin-1', 'replace')
+
+
+async def async_headers(reader):
+    # Interim responses (1XX) are skipped; repeated headers are combined and
+    # folded lines joined, as 'requests' does.
+    status_c, start_h = 100, perf_counter()
+    while status_c < 200:
+        status_l = (await reader.readline()).decode('latin-1').split(None, 2)
+        if tracer:
+            tracer.span('ttfb', 'fetch', start_h)
+        if len(status_l) < 2 or not status_l[0].startswith('HTTP/') or \
+                not status_l[1].isdigit():
+            raise ValueError(status_l)
+        status_c = int(status_l[1])
+        headers, key = requests.structures.CaseInsensitiveDict(), None
+        while line := (await reader.readline()).decode('latin-1').rstrip(
+                CRLF):
+            if line[0] in ' \t' and key:
+                headers[key] = f"{headers[key]} {line.strip()}"
+                continue
+            key, sep, value = line.partition(':')
+            key, value = key.strip(), value.strip()
+            if not (sep and key):
+                key = None
+            elif key in headers:
+                headers[key] = f"{headers[key]}, {value}"
+            elif len(headers) < args.max_headers:
+                headers[key] = value
+            else:
+                key = None
+    return status_c, headers
+
+
+def analysis_missing(headers):
+    # Report - 1. Missing HTTP Security Headers
+    m_cnt = 0
+    print_detail_r('[1missing]')
+
+    missing_headers_lower = {k.lower(): v for k, v in headers.items()}
+
+    for i, key in enumerate(l_miss):
+        if key.lower() not in missing_headers_lower:
+            rule_add(key)
+            print_header(key)
+            if not args.brief:
+                print_detail(l_detail[i], 2)
+            m_cnt += 1
+
+    if not (headers.get('X-Frame-Options') or 'frame-ancestors' in
+            headers.get('Content-Security-Policy', '')):
+        rule_add('X-Frame-Options')
+        print_header('X-Frame-Options')
+        if not args.brief:
+            print_detail("[mxfo]", 2)
+        m_cnt += 1
+
+    if not any(elem.lower() in headers for elem in l_miss):
+        rule_add('X-Frame-Options')
+        print_header('X-Frame-Options')
+        if not args.brief:
+            print_detail("[mxfo]", 2)
+        m_cnt += 1
+
+    if args.brief and m_cnt != 0:
+        print_w("")
+
+    if m_cnt == 0:
+        print_ok()
+
+    print_w("")
+    return m_cnt
+
+
+def analysis_fingerprint(headers):
+    # Report - 2. Fingerprinting through headers/values
+    print_detail_r('[2fingerprint]')
+
+    if not args.brief:
+        print_detail("[afgp]")
+
+    f_cnt = fingerprint_headers(headers, l_fng, l_fng_ex)
+
+    if args.brief and f_cnt != 0:
+        print_w("")
+
+    if f_cnt == 0:
+        print_ok()
+
+    print_w("")
+    return f_cnt
+
+
+def analysis_insecure(headers):
+    # Report - 3. Deprecated HTTP Headers/Protocols and Insecure values
+    i_cnt = [0]
+
+    print_detail_r('[3depinsecure]')
+
+    if not args.brief:
+        print_detail("[aisc]")
+
+    if 'Accept-CH' in headers:
+        acceptch_header = headers['Accept-CH'].lower()
+        if URL.startswith(INS_S):
+            print_details('[ixach_h]', '[ixach]', 'd', i_cnt)
+        if 'sec-ch-ua-full-version' in acceptch_header:
+            print_detail_r('[ixachd_h]', is_red=True)
+            if not args.brief:
+                print_detail_l('[ixachd_s]')
+                print_w('sec-ch-ua-full-version')
+                print_detail('[ixachd]')
+            i_cnt[0] += 1
+
+    if 'Accept-CH-Lifetime' in headers:
+        print_details('[ixacl_h]', '[ixacld]', 'd', i_cnt)
+
+    accescred_header = headers.get("Access-Control-Allow-Credentials",
+                                   '').lower()
+    if accescred_header and accescred_header != 'true':
+        print_details('[icred_h]', '[icred]', 'd', i_cnt)
+
+    if 'Access-Control-Allow-Methods' in headers:
+        methods = headers["Access-Control-Allow-Methods"]
+        if match_method := [x for x in l_methods if x in methods]:
+            print_detail_r('[imethods_h]', is_red=True)
+            if not args.brief:
+                match_method_str = ', '.join(match_method)
+                print_detail_l("[imethods_s]")
+                print_w(match_method_str)
+                print_detail("[imethods]")
+            i_cnt[0] += 1
+
+    accesso_header = headers.get("Access-Control-Allow-Origin", '').lower()
+    if accesso_header and ((accesso_header in ['*', 'null']) and
+                           (not any(val in accesso_header for
+                                    val in ['.*', '*.']))):
+        print_details('[iaccess_h]', '[iaccess]', 'd', i_cnt)
+
+    # Untrusted: longer values than 86400 are not even converted.
+    accesma_header = headers.get("Access-Control-Max-Age", '').strip()
+    accesma_digits = accesma_header.lstrip('0')
+    if accesma_header.isdecimal() and (len(accesma_digits) > 5 or
+                                       int(accesma_digits or 0) > 86400):
+        print_details('[iacessma_h]', '[iaccessma]', 'd', i_cnt)
+
+    if 'Allow' in headers:
+        methods = headers["Allow"]
+        if match_method := [x for x in l_methods if x in methods]:
+            print_detail_r('[imethods_hh]', is_red=True)
+            if not args.brief:
+                match_method_str = ', '.join(match_method)
+                print_detail_l("[imethods_s]")
+                print_w(match_method_str)
+                print_detail("[imethods]")
+            i_cnt[0] += 1
+
+    cache_header = headers.get("Cache-Control", '').lower()
+    if cache_header and not any(elem in cache_header for elem in l_cachev):
+        print_details('[icachev_h]', '[icachev]', 'd', i_cnt)
+    if cache_header and not all(elem in cache_header for elem in l_cache):
+        print_details('[icache_h]', '[icache]', 'd', i_cnt)
+
+    if 'Clear-Site-Data' in headers:
+        clsdata_header = headers['Clear-Site-Data'].lower()
+        if URL.startswith(INS_S):
+            print_details('[icsd_h]', '[icsd]', 'd', i_cnt)
+        if not any(elem in clsdata_header for elem in l_csdata):
+            print_details('[icsdn_h]', '[icsdn]', 'd', i_cnt)
+
+    cencod_header = headers.get("Content-Encoding", '').lower()
+    if cencod_header and not any(elem in cencod_header for elem in
+                                 l_cencoding):
+        print_details('[icencod_h]', '[icencod]', 'd', i_cnt)
+
+    if 'Content-DPR' in headers:
+        print_details('[ixcdpr_h]', '[ixcdprd]', 'd', i_cnt)
+
+    if 'Content-Security-Policy' in headers:
+        csp_h = headers['Content-Security-Policy'].lower()
+        if not any(elem in csp_h for elem in l_csp_dirs):
+            print_details('[icsi_h]', '[icsi]', 'd', i_cnt)
+        if ('=' in csp_h) and not (any(elem in csp_h for elem in l_csp_equal)):
+            print_details('[icsn_h]', '[icsn]', 'd', i_cnt)
+        csp_store_values(csp_h, l_csp_broad, l_csp_insecure, i_cnt)
+        if any(elem in csp_h for elem in ['unsafe-eval', 'unsafe-inline']):
+            print_details('[icsp_h]', '[icsp]', 'm', i_cnt)
+        if 'unsafe-hashes' in csp_h:
+            print_details('[icsu_h]', '[icsu]', 'd', i_cnt)
+        if "'nonce-" in csp_h:
+            nonces_csp = re.findall(r"'nonce-([^']+)'", csp_h)
+            for nonce_csp in nonces_csp:
+                if len(nonce_csp) < 32:
+                    print_details('[icsnces_h]', '[icsnces]', 'd', i_cnt)
+                    break
+        ip_mtch = re.findall(IP_PTRN, csp_h)
+        if ip_mtch != ['127.0.0.1']:
+            for match in ip_mtch:
+                if re.match(IP_PTRN, match):
+                    print_details('[icsipa_h]', '[icsipa]', 'm', i_cnt)
+                    break
+
+    csp_ro_header = headers.get('Content-Security-Policy-Report-Only',
+                                '').lower()
+    if csp_ro_header and any(elem in csp_ro_header for elem in l_csp_ro_dep):
+        print_detail_r('[icsiro_d]', is_red=True)
+        if not args.brief:
+            matches_csp_ro = [x for x in l_csp_ro_dep if x in csp_ro_header]
+            print_detail_l("[icsi_d_s]")
+            print_w(', '.join(matches_csp_ro))
+            print_detail("[icsiro_d_r]")
+        i_cnt[0] += 1
+
+    ctype_header = headers.get('Content-Type', '').lower()
+    if ctype_header:
+        if any(elem in ctype_header for elem in l_legacy):
+            print_details('[ictlg_h]', '[ictlg]', 'm', i_cnt)
+        if 'html' not in ctype_header:
+            print_details('[ictlhtml_h]', '[ictlhtml]', 'd', i_cnt)
+
+    if 'Critical-CH' in headers and URL.startswith(INS_S):
+        print_details('[icrch_h]', '[icrch]', 'd', i_cnt)
+
+    if 'Cross-Origin-Embedder-Policy' in headers:
+        coep_h = headers['Cross-Origin-Embedder-Policy'].lower()
+        if not any(elem in coep_h for elem in l_coep):
+            print_details('[icoep_h]', '[icoep]', 'd', i_cnt)
+
+    if 'Cross-Origin-Opener-Policy' in headers:
+        coop_h = headers['Cross-Origin-Opener-Policy'].lower()
+        if not any(elem in coop_h for elem in l_coop):
+            print_details('[icoop_h]', '[icoop]', 'd', i_cnt)
+
+    if 'Cross-Origin-Resource-Policy' in headers:
+        corp_h = headers['Cross-Origin-Resource-Policy'].lower()
+        if not any(elem in corp_h for elem in l_corp):
+            print_details('[icorp_h]', '[icorp]', 'd', i_cnt)
+
+    if 'Digest' in headers:
+        print_details('[idig_h]', '[idig]', 'd', i_cnt)
+
+    if 'Etag' in headers:
+        print_details('[ieta_h]', '[ieta]', 'd', i_cnt)
+
+    if 'Expect-CT' in headers:
+        print_details('[iexct_h]', '[iexct]', 'm', i_cnt)
+
+    if 'Expires' in headers and any(elem in headers.get('Cache-Control', '')
+                                    for elem in l_excc):
+        print_details('[iexpi_h]', '[iexpi]', 'd', i_cnt)
+
+    if 'Feature-Policy' in headers:
+        print_details('[iffea_h]', '[iffea]', 'd', i_cnt)
+
+    if URL.startswith(INS_S):
+        print_details('[ihttp_h]', '[ihttp]', 'd', i_cnt)
+
+    if ('Keep-Alive' in headers and headers['Keep-Alive'] and
+        ('Connection' not in headers or
+         headers['Connection'].lower() != 'keep-alive')):
+        print_details('[ickeep_h]', '[ickeep]', 'd', i_cnt)
+
+    if 'Large-Allocation' in headers:
+        print_details('[ixlalloc_h]', '[ixallocd]', 'd', i_cnt)
+
+    if 'Onion-Location' in headers:
+        print_details('[ionloc_h]', '[ionloc]', 'm', i_cnt)
+
+    if 'P3P' in headers:
+        print_details('[ip3p_h]', '[ip3p]', 'd', i_cnt)
+
+    if 'Permissions-Policy' in headers:
+        perm_header = headers['Permissions-Policy'].lower()
+        if not any(elem in perm_header for elem in l_per_dirs):
+            print_details('[ifpoln_h]', '[ifpoln]', 'm', i_cnt)
+        if '*' in perm_header:
+            print_details('[ifpol_h]', '[ifpol]', 'd', i_cnt)
+        if 'none' in perm_header:
+            print_details('[ifpoli_h]', '[ifpoli]', 'd', i_cnt)
+        if 'document-domain' in perm_header:
+            print_detail_r('[ifpold_h]', is_red=True)
+            if not args.brief:
+                print_detail_l('[ifpold_s]')
+                print_w('document-domain')
+                print_detail('[ifpold]')
+            i_cnt[0] += 1
+
+    if 'Pragma' in headers:
+        print_details('[iprag_h]', '[iprag]', 'd', i_cnt)
+
+    if 'Public-Key-Pins' in headers:
+        print_details('[ipkp_h]', '[ipkp]', 'd', i_cnt)
+
+    if 'Public-Key-Pins-Report-Only' in headers:
+        print_details('[ipkpr_h]', '[ipkp]', 'd', i_cnt)
+
+    referrer_header = headers.get('Referrer-Policy', '').lower()
+    if referrer_header:
+        if not any(elem in referrer_header for elem in l_ref_secure):
+            print_details('[iref_h]', '[iref]', 'm', i_cnt)
+        if 'unsafe-url' in referrer_header:
+            print_details('[irefi_h]', '[irefi]', 'd', i_cnt)
+        if not any(elem in referrer_header for elem in l_ref_values):
+            print_details('[irefn_h]', '[irefn]', 'd', i_cnt)
+
+    if 'Server-Timing' in headers:
+        print_details('[itim_h]', '[itim]', 'd', i_cnt)
+
+    ck_header = headers.get("Set-Cookie", '').lower()
+    if ck_header:
+        if not (URL.startswith(INS_S)) and not all(elem in ck_header for
+                                                   elem in ('secure',
+                                                            'httponly')):
+            print_details("[iset_h]", "[iset]", "d", i_cnt)
+        if (URL.startswith(INS_S)) and ('secure' in ck_header):
+            print_details("[iseti_h]", "[iseti]", "d", i_cnt)
+        if "samesite=none" in ck_header and "secure" not in ck_header:
+            print_details("[iseti_m]", "[isetm]", "d", i_cnt)
+
+    if 'Strict-Dynamic' in headers:
+        print_details('[isdyn_h]', '[isdyn]', 'd', i_cnt)
+
+    # Untrusted: only the first digits of max-age are converted (any longer
+    # value is above 31536000 anyway).
+    sts_header = headers.get('Strict-Transport-Security', '').lower()
+    if (sts_header) and not (URL.startswith(INS_S)):
+        sts_age = re.search(r'max-age\s*=\s*"?0*(\d{1,12})', sts_header)
+        if 'includesubdomains' not in sts_header or not sts_age or \
+                int(sts_age[1]) < 31536000:
+            print_details('[ists_h]', '[ists]', 'm', i_cnt)
+        if ',' in sts_header:
+            print_details('[istsd_h]', '[istsd]', 'd', i_cnt)
+
+    if (sts_header) and (URL.startswith(INS_S)):
+        print_details('[ihsts_h]', '[ihsts]', 'd', i_cnt)
+
+    if headers.get('Timing-Allow-Origin', '') == '*':
+        print_details('[itao_h]', '[itao]', 'd', i_cnt)
+
+    if 'Tk' in headers:
+        print_details('[ixtk_h]', '[ixtkd]', 'd', i_cnt)
+
+    if 'Trailer' in headers:
+        trailer_h = headers['Trailer'].lower()
+        if any(elem in trailer_h for elem in l_trailer):
+            print_detail_r('[itrailer_h]', is_red=True)
+            if not args.brief:
+                matches_trailer = [x for x in l_trailer if x in trailer_h]
+                print_detail_l("[itrailer_d_s]")
+                print_w(', '.join(matches_trailer))
+                print_detail("[itrailer_d_r]")
+            i_cnt[0] += 1
+
+    if 'Transfer-Encoding' in headers:
+        transfer_h = headers['Transfer-Encoding'].lower()
+        if not any(elem in transfer_h for elem in l_transfer):
+            print_details('[ictrf_h]', '[itrf]', 'd', i_cnt)
+
+    if 'Warning' in headers:
+        print_details('[ixwar_h]', '[ixward]', 'd', i_cnt)
+
+    wwwa_header = headers.get('WWW-Authenticate', '').lower()
+    if (wwwa_header) and (URL.startswith(INS_S)) and ('basic' in wwwa_header):
+        print_details('[ihbas_h]', '[ihbas]', 'd', i_cnt)
+
+    if 'X-Content-Security-Policy' in headers:
+        print_details('[ixcsp_h]', '[ixcsp]', 'd', i_cnt)
+
+    if 'X-Content-Security-Policy-Report-Only' in headers:
+        print_details('[ixcspr_h]', '[ixcspr]', 'd', i_cnt)
+
+    if 'X-Content-Type-Options' in headers:
+        if ',' in headers['X-Content-Type-Options']:
+            print_details('[ictpd_h]', '[ictpd]', 'd', i_cnt)
+        elif 'nosniff' not in headers['X-Content-Type-Options']:
+            print_details('[ictp_h]', '[ictp]', 'd', i_cnt)
+
+    if headers.get('X-DNS-Prefetch-Control', '') == 'on':
+        print_details('[ixdp_h]', '[ixdp]', 'd', i_cnt)
+
+    if 'X-Download-Options' in headers:
+        print_details('[ixdow_h]', '[ixdow]', 'm', i_cnt)
+
+    xfo_header = headers.get('X-Frame-Options', '').lower()
+    if xfo_header:
+        if ',' in xfo_header:
+            print_details('[ixfo_h]', '[ixfo]', 'm', i_cnt)
+        if 'allow-from' in xfo_header:
+            print_details('[ixfod_h]', '[ixfod]', 'm', i_cnt)
+        if xfo_header not in ['deny', 'sameorigin']:
+            print_details('[ixfoi_h]', '[ixfodi]', 'm', i_cnt)
+
+    if 'X-Pad' in headers:
+        print_details('[ixpad_h]', '[ixpad]', 'd', i_cnt)
+
+    if headers.get('X-Permitted-Cross-Domain-Policies', '') == 'all':
+        print_details('[ixcd_h]', '[ixcd]', 'm', i_cnt)
+
+    if headers.get('X-Pingback', '').endswith('xmlrpc.php'):
+        print_details('[ixpb_h]', '[ixpb]', 'd', i_cnt)
+
+    robots_header = headers.get('X-Robots-Tag', '').lower()
+    if robots_header:
+        if not any(elem in robots_header for elem in l_robots):
+            print_details('[ixrobv_h]', '[ixrobv]', 'm', i_cnt)
+        if 'all' in robots_header:
+            print_details('[ixrob_h]', '[ixrob]', 'm', i_cnt)
+
+    if 'X-Runtime' in headers:
+        print_details('[ixrun_h]', '[ixrun]', 'd', i_cnt)
+
+    if 'X-SourceMap' in headers:
+        print_details('[ixsrc_h]', '[ixsrc]', 'd', i_cnt)
+
+    if 'X-UA-Compatible' in headers:
+        print_details('[ixuacom_h]', '[ixuacom]', 'm', i_cnt)
+
+    if 'X-Webkit-CSP' in headers:
+        print_details('[ixwcsp_h]', '[ixcsp]', 'd', i_cnt)
+
+    if 'X-Webkit-CSP-Report-Only' in headers:
+        print_details('[ixwcspr_h]', '[ixcspr]', 'd', i_cnt)
+
+    if 'X-XSS-Protection' in headers:
+        if '0' not in headers["X-XSS-Protection"]:
+            print_details('[ixxp_h]', '[ixxp]', 'd', i_cnt)
+        if ',' in headers['X-XSS-Protection']:
+            print_details('[ixxpd_h]', '[ixxpd]', 'd', i_cnt)
+
+    if args.brief and i_cnt[0] != 0:
+        print_w("")
+
+    if i_cnt[0] == 0:
+        print_ok()
+
+    print_w("")
+    return i_cnt
+
+
+def analysis_empty(headers):
+    # Report - 4. Empty HTTP Response Headers Values
+    e_cnt = 0
+    empty_s_headers = sorted(key for key, value in headers.items() if
+                             not value)
+    l_empty = []
+    print_detail_r('[4empty]')
+
+    if not args.brief:
+        print_detail("[aemp]")
+
+    for key in empty_s_headers:
+        l_empty.append("_" + key)
+        rule_add(key)
+        print_header(key)
+        e_cnt += 1
+
+    print_w("") if e_cnt != 0 else print_ok()
+    print_w("")
+    return e_cnt, l_empty
+
+
+def analysis_report():
+    # Sections of the analysis of a single URL, shared with '--daemon'.
+    global m_cnt, f_cnt, i_cnt, e_cnt, l_empty, end
+    print_summary()
+    print_headers()
+    m_cnt = analysis_missing(headers)
+    f_cnt = analysis_fingerprint(headers)
+    i_cnt = analysis_insecure(headers)
+    e_cnt, l_empty = analysis_empty(headers)
+    analysis_compat(headers)
+    print_w(linesep.join(['']*2))
+    end = time()
+    analysis_time()
+
+
+def analysis_compat(headers):
+    # Report - 5. Browser Compatibility for Enabled HTTP Security Headers
+    print_detail_r('[5compat]')
+
+    header_matches = [header for header in l_sec if header in headers]
+
+    if header_matches:
+        for key in header_matches:
+            output_string = "  " if args.output == 'html' else " "
+            key_string = key if args.output else Fore.CYAN + key + Fore.RESET
+            print_w(f"{output_string}{key_string}{CAN_S}\
+{key.replace('Content-Security-Policy', 'contentsecuritypolicy2')}")
+    else:
+        print_detail_l("[bcompat_n]") if args.output else \
+            print_detail_r("[bcompat_n]", is_red=True)
+
+
+class RateLimiter:
+    # Token buckets per registered domain and per IP, plus an adaptive limit
+    # of concurrent requests (capped by '--concurrency'): halved when the
+    # targets throttle us (429, CDN 52x or 'Retry-After') and increased by
+    # one after each full round of successful requests.
+
+    def __init__(self, max_c, rate_d, rate_ip):
+        self.cond = threading.Condition()
+        self.max_c = self.limit_c = max_c
+        self.rates = {'d': rate_d, 'ip': rate_ip}
+        self.active = self.ok_cnt = 0
+        self.buckets = {}
+        self.backoff = {}
+        self.freed = None
+
+    def acquire(self, keys):
+        for key in keys:
+            while wait := self.take(key):
+                sleep(wait)
+        with self.cond:
+            while self.active >= self.limit_c:
+                self.cond.wait()
+            self.active += 1
+
+    async def acquire_async(self, keys):
+        # Same, for the fetches of '--async' (all of them run by the thread
+        # of the event loop, so 'active' is only checked from there).
+        for key in keys:
+            while wait := self.take(key):
+                await asyncio.sleep(wait)
+        self.freed = self.freed or asyncio.Event()
+        while self.active >= self.limit_c:
+            self.freed.clear()
+            await self.freed.wait()
+        with self.cond:
+            self.active += 1
+
+    def take(self, key):
+        # Returns the seconds to wait for a token of 'key' (0 once taken).
+        rate = self.rates[key[0]]
+        if rate <= 0:
+            return 0
+        with self.cond:
+            now = time()
+            tokens, last = self.buckets.get(key, (rate, now))
+            tokens = min(max(rate, 1), tokens + (now - last) * rate)
+            wait = max(self.backoff.get(key, (0, 0))[0] - now,
+                       (1 - tokens) / rate)
+            if wait <= 0:
+                self.buckets[key] = (tokens - 1, now)
+                return 0
+            self.buckets[key] = (tokens, now)
+        return wait
+
+    def release(self, keys, throttled, retry_a):
+        with self.cond:
+            self.active -= 1
+            if throttled:
+                self.limit_c = max(1, self.limit_c // 2)
+                self.ok_cnt = 0
+                for key in keys:
+                    count = self.backoff.get(key, (0, 0))[1] + 1
+                    pause = retry_a or RATE_B * 2 ** (count - 1)
+                    self.backoff[key] = (time() + min(pause, RATE_M), count)
+            else:
+                for key in keys:
+                    self.backoff.pop(key, None)
+                self.ok_cnt += 1
+                if self.ok_cnt >= self.limit_c and self.limit_c < self.max_c:
+                    self.limit_c += 1
+                    self.ok_cnt = 0
+            self.cond.notify_all()
+        if self.freed:
+            self.freed.set()
+
+
+class CircuitBreaker:
+    # Per host: after BREAK_N consecutive timeouts or connection errors, its
+    # URLs fail at once, without retrieving them, for 'ttl' seconds; then one
+    # more error opens the circuit again. Open circuits are saved to
+    # 'CACHE_F' (the negative cache), so they also apply to the next runs.
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.errors = Counter()
+        conn = cache_open()
+        with conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS breaker (host TEXT \
+PRIMARY KEY, until REAL)")
+            conn.execute("DELETE FROM breaker WHERE until <= ?", (time(),))
+            self.opened = dict(conn.execute("SELECT host, until FROM \
+breaker"))
+        conn.close()
+
+    def check(self, url):
+        host = urlsplit(url).hostname or ''
+        with self.lock:
+            if host not in self.opened:
+                return None
+            if self.opened[host] > time():
+                return '[e_circuit]'
+            del self.opened[host]
+            self.errors[host] = BREAK_N - 1
+        return None
+
+    def record(self, url, id_error):
+        host = urlsplit(url).hostname or ''
+        with self.lock:
+            if id_error not in ('[e_404]', '[e_timeout]'):
+                self.errors.pop(host, None)
+                return
+            self.errors[host] += 1
+            if self.errors[host] < BREAK_N or host in self.opened:
+                return
+            self.opened[host] = time() + self.ttl
+            conn = cache_open()
+            with conn:
+                conn.execute("INSERT OR REPLACE INTO breaker VALUES (?, ?)",
+                             (host, self.opened[host]))
+            conn.close()
+
+
+class Metrics:
+    # Prometheus text format. Updating the metrics (once per fetch and once
+    # per analysis) only takes a lock and a few dict increments.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = defaultdict(int, {('humble_scans_total', ''): 0})
+        self.fetch_b = [0] * (len(METRICS_B) + 1)
+        self.fetch_s = 0
+        self.save_t = 0
+
+    def fetch(self, fetch_t, response):
+        _, status_c, id_error = response
+        with self.lock:
+            self.fetch_b[bisect_left(METRICS_B, fetch_t)] += 1
+            self.fetch_s += fetch_t
+            if status_c:
+                self.counters[('humble_responses_total',
+                               f'code_class="{status_c // 100}xx"')] += 1
+            if id_error:
+                self.counters[('humble_errors_total',
+                               f'error="{id_error[1:-1]}"')] += 1
+
+    def error(self, id_error):
+        with self.lock:
+            self.counters[('humble_errors_total',
+                           f'error="{id_error[1:-1]}"')] += 1
+
+    def scan(self, m_cnt, f_cnt, i_cnt, e_cnt):
+        with self.lock:
+            self.counters[('humble_scans_total', '')] += 1
+            for section, cnt in (('missing', m_cnt), ('fingerprint', f_cnt),
+                                 ('insecure', i_cnt), ('empty', e_cnt)):
+                self.counters[('humble_findings_total',
+                               f'section="{section}"')] += cnt
+
+    def export(self):
+        with self.lock:
+            counters = sorted(self.counters.items())
+            fetch_b, fetch_s = list(self.fetch_b), self.fetch_s
+        l_metrics, name_p = [], None
+        for (name, labels), value in counters:
+            if name != name_p:
+                l_metrics += [f"# HELP {name} {METRICS_H[name]}",
+                              f"# TYPE {name} counter"]
+                name_p = name
+            l_metrics.append(f"{name}{{{labels}}} {value}" if labels else
+                             f"{name} {value}")
+        name = 'humble_fetch_seconds'
+        l_metrics += [f"# HELP {name} {METRICS_H[name]}",
+                      f"# TYPE {name} histogram"]
+        fetch_c = 0
+        for le, cnt in zip(METRICS_B + ['+Inf'], fetch_b):
+            fetch_c += cnt
+            l_metrics.append(f'{name}_bucket{{le="{le}"}} {fetch_c}')
+        l_metrics += [f"{name}_sum {round(fetch_s, 6)}",
+                      f"{name}_count {fetch_c}"]
+        return '\n'.join(l_metrics) + '\n'
+
+    def save(self, force=False):
+        # For the textfile collector of node_exporter: written at most every
+        # 'CKPT_S' seconds, and replaced atomically.
+        if not args.metrics_file or not (force or time() - self.save_t >=
+                                         CKPT_S):
+            return
+        self.save_t = time()
+        with open(f"{args.metrics_file}.tmp", 'w', encoding='utf8') as m_file:
+            m_file.write(self.export())
+        replace(f"{args.metrics_file}.tmp", args.metrics_file)
+
+
+class Tracer:
+    # Chrome Trace Event Format ('--trace'), for Perfetto or chrome://tracing:
+    # a complete event ('X') for each span of a target or stage, on the thread
+    # where it happened (or the lane of each fetch of '--async'). Spans are
+    # kept in memory and written TRACE_N at a time, so each one costs about a
+    # microsecond.
+    def __init__(self, name):
+        self.name = name
+        self.file = open(name, 'w', encoding='utf8')
+        self.file.write('[\n')
+        self.lock = threading.Lock()
+        self.events, self.threads, self.lanes = [], {}, []
+        self.lane_n, self.pid, self.start_t = 0, getpid(), perf_counter()
+
+    def span(self, name, cat, begin, end=None, **t_args):
+        tid = trace_lane.get() or threading.get_ident()
+        with self.lock:
+            if tid not in self.threads:
+                self.threads[tid] = (len(self.threads) + 1, f"async {tid[1]}"
+                                     if isinstance(tid, tuple) else
+                                     threading.current_thread().name)
+            self.events.append((name, cat, begin, end or perf_counter(),
+                                self.threads[tid][0], t_args))
+            full = len(self.events) >= TRACE_N
+        if full:
+            self.flush()
+
+    @contextlib.contextmanager
+    def spanning(self, name, cat, **t_args):
+        # 't_args' can be updated within the span (e.g. with its result).
+        begin = perf_counter()
+        try:
+            yield t_args
+        finally:
+            self.span(name, cat, begin, **t_args)
+
+    def lane(self):
+        # Fetches of '--async' run on the same thread: each one is shown on
+        # the first lane not in use, as if it were a thread of the pool.
+        with self.lock:
+            if not self.lanes:
+                self.lane_n += 1
+                self.lanes.append(self.lane_n)
+            lane = self.lanes.pop()
+        trace_lane.set(('lane', lane))
+        return lane
+
+    def release(self, lane):
+        with self.lock:
+            self.lanes.append(lane)
+
+    def flush(self):
+        with self.lock:
+            events, self.events = self.events, []
+            self.file.write(''.join(json.dumps(
+                {'name': name, 'cat': cat, 'ph': 'X', 'pid': self.pid,
+                 'tid': tid, 'ts': round((begin - self.start_t) * 1e6, 1),
+                 'dur': round((end - begin) * 1e6, 1), 'args': t_args}) +
+                ',\n' for name, cat, begin, end, tid, t_args in events))
+
+    def close(self):
+        self.flush()
+        self.file.write(''.join(json.dumps(
+            {'name': 'thread_name', 'ph': 'M', 'pid': self.pid, 'tid': tid,
+             'args': {'name': name}}) + ',\n' for tid, name in
+            self.threads.values()))
+        self.file.write(json.dumps({'name': 'process_name', 'ph': 'M',
+                                    'pid': self.pid,
+                                    'args': {'name': 'humble'}}) + '\n]\n')
+        self.file.close()
+        print_w("")
+        print_detail_l('[trace_saved]')
+        print_w(path.abspath(self.name))
+
+
+def traced(name, cat, **t_args):
+    return tracer.spanning(name, cat, **t_args) if tracer else \
+        contextlib.nullcontext(t_args)
+
+
+def traced_tls(*t_args, **t_kwargs):
+    # Replaces urllib3's 'ssl_wrap_socket()' with '--trace'.
+    with traced('tls', 'fetch'):
+        return ssl_wrap_socket(*t_args, **t_kwargs)
+
+
+def trace_close():
+    if tracer:
+        tracer.close()
+
+
+class TargetResult:
+    # Compact result of a URL analyzed along with others: counts and findings
+    # (as ids of 'l_rules': catalog ids and header names) instead of headers
+    # and report text, which are rendered only when needed.
+    __slots__ = ('url', 'date', 'counts', 'rules', 'ends', 'error')
+
+    def __init__(self, url, counts=(), rules=(), ends=(), error=None):
+        self.url = url
+        self.date = time()
+        self.counts = array('H', counts)
+        # 'l_rules' grows with each header name seen in a run, without limit.
+        self.rules = array('I', rules)
+        self.ends = array('H', ends)
+        self.error = error
+
+    def __str__(self):
+        if self.error:
+            return self.error
+        date_r = datetime.fromtimestamp(self.date).strftime("%Y/%m/%d - \
+%H:%M:%S")
+        return f"{date_r} ; {self.url} ; {' ; '.join(map(str, self.counts))} \
+; {sum(self.counts)}"
+
+    def findings(self):
+        return [rule_text(rule_n) for rule_n in self.rules]
+
+    def sections(self):
+        # Findings of each section ('ends' are the offsets of the last three).
+        bounds = (0, *self.ends, len(self.rules))
+        return [self.rules[bounds[section_n]:bounds[section_n + 1]] for
+                section_n in range(len(bounds) - 1)]
+
+    def rule_names(self):
+        # As 'l_rules' entries, which do not depend on the language.
+        return [[l_rules[rule_n] for rule_n in rules] for rules in
+                self.sections()]
+
+
+def rule_text(rule_n):
+    rule = l_rules[rule_n]
+    return get_detail(rule, replace=True).strip() if rule.startswith('[') \
+        else rule
+
+
+def rule_id(rule):
+    if (rule_n := rule_ids.get(rule)) is None:
+        rule_n = rule_ids[rule] = len(l_rules)
+        l_rules.append(sys.intern(rule))
+    return rule_n
+
+
+def rule_add(rule):
+    # Findings of the analysis in progress, only when collected ('rules_c').
+    if rules_c is not None:
+        rules_c.append(rule_id(rule))
+
+
+def compact_headers(headers):
+    # Retrieved headers waiting to be analyzed: a tuple with the names
+    # interned, instead of a 'CaseInsensitiveDict'.
+    return tuple((sys.intern(key), value) for key, value in headers.items())
+
+
+class FleetReport:
+    # Aggregates of the URLs analyzed in a run, updated once per URL: memory
+    # only grows with the distinct findings and registered domains.
+    def __init__(self):
+        self.targets = 0
+        self.failed = Counter()
+        self.sections = [Counter() for _ in range(4)]
+        self.domains = defaultdict(lambda: array('L', [0] * 6))
+        self.products = {fng.title(): fng_ex.partition(' [')[2][:-1] or fng
+                         for fng, fng_ex in zip(l_fng, l_fng_ex)}
+
+    def add(self, result):
+        domain = self.domains[get_domain(result.url)]
+        domain[0] += 1
+        if result.error:
+            self.failed[result.error] += 1
+            domain[1] += 1
+            return
+        self.targets += 1
+        for cnt_n, cnt in enumerate(result.counts):
+            domain[cnt_n + 2] += cnt
+        # Incidence: each finding is counted once per URL.
+        for section_n, rules in enumerate(result.sections()):
+            if section_n == 1:
+                rules = {self.products.get(l_rules[rule_n], l_rules[rule_n])
+                         for rule_n in rules}
+            self.sections[section_n].update(set(rules))
+
+    def print_report(self):
+        print_analytics('[fleet_report]', {
+            get_detail('[fleet_urls]', replace=True):
+            f"{self.targets} ({sum(self.failed.values())})\n"}, True)
+        for section_n, section_s in enumerate(('[fleet_missing]',
+                                               '[fleet_fingerprint]',
+                                               '[fleet_insecure]',
+                                               '[fleet_empty]')):
+            print_section(get_detail(section_s, replace=True),
+                          [(name, f"{cnt} ({cnt / self.targets:.0%})") for
+                           name, cnt in self.fleet_top(section_n)])
+            print_w("")
+        rows = []
+        for domain, cnts in sorted(self.domains.items(), key=lambda x:
+                                   -sum(x[1][2:]))[:FLEET_N]:
+            analyzed = (cnts[0] - cnts[1]) or 1
+            avgs = [cnt / analyzed for cnt in cnts[2:]]
+            rows.append((domain, f"{cnts[0]} ; {sum(avgs):.1f} \
+({' / '.join(f'{avg:.1f}' for avg in avgs)})"))
+        print_section(get_detail('[fleet_domains]', replace=True), rows)
+        if self.failed:
+            print_w("")
+            print_section(get_detail('[queue_failed]', replace=True).rstrip(
+                ':'), [(get_detail(id_error, replace=True).strip(), cnt) for
+                       id_error, cnt in self.failed.most_common(FLEET_N)])
+
+    def fleet_top(self, section_n):
+        return [(rule_text(rule) if isinstance(rule, int) else rule, cnt)
+                for rule, cnt in
+                self.sections[section_n].most_common(FLEET_N)]
+
+    def save(self, fleet_file):
+        # Incidence of each finding (by section) and breakdown of the warnings
+        # by registered domain, as CSV.
+        with open(fleet_file, 'w', encoding='utf8') as f_file:
+            f_file.write("group,name,urls,percent,missing,fingerprint,\
+insecure,empty\n")
+            for section_n, section in enumerate(('missing', 'fingerprint',
+                                                 'insecure', 'empty')):
+                for rule, cnt in self.sections[section_n].most_common():
+                    name = rule_text(rule) if isinstance(rule, int) else rule
+                    f_file.write(f"{section},{csv_value(name)},{cnt},\
+{cnt / max(self.targets, 1):.4f},,,,\n")
+            for domain, cnts in sorted(self.domains.items()):
+                f_file.write(f"domain,{csv_value(domain)},{cnts[0]},,\
+{','.join(str(cnt) for cnt in cnts[2:])}\n")
+
+
+def csv_value(value):
+    return f'"{value}"' if ',' in value or '"' in value else value
+
+
+def get_domain(url):
+    # Registered domain (the host if it has no public suffix, e.g. an IP).
+    name_s = tldextract.extract(url)
+    return f"{name_s.domain}.{name_s.suffix}" if name_s.suffix else \
+        urlsplit(url).hostname or ''
+
+
+def fleet_report(fleet_file):
+    with traced('export', 'write', file=fleet_file):
+        fleet.print_report()
+        fleet.save(fleet_file)
+    print_w("")
+    print_detail_l('[report]')
+    print_w(path.abspath(fleet_file))
+
+
+class RunResults:
+    # Results of each URL of a run ('--results'), one line per URL: the URL,
+    # the hash of its headers (or the error), the headers (see 'watch_lines')
+    # and the findings of each section, as 'l_rules' entries so they do not
+    # depend on the language. Compressed if FILE ends with '.gz'.
+    def __init__(self, name, append):
+        self.name = name
+        self.file = results_open(name, 'a' if append else 'w')
+
+    def add(self, result, headers=None):
+        if result.error:
+            self.file.write(f"{result.url}\t{result.error}\t[]\t[]\n")
+            return
+        l_headers = watch_lines(headers)
+        findings = result.rule_names()
+        h_hash = hashlib.sha1('\n'.join(l_headers).encode()).hexdigest()
+        self.file.write(f"{result.url}\t{h_hash}\t{json.dumps(l_headers)}\t\
+{json.dumps(findings)}\n")
+
+    def close(self):
+        self.file.close()
+        print_w("")
+        print_detail_l('[report]')
+        print_w(path.abspath(self.name))
+
+
+def results_open(name, mode):
+    if name.endswith('.gz'):
+        return gzip.open(name, f"{mode}t", encoding='utf8')
+    return open(name, mode, encoding='utf8')
+
+
+def results_lines(name):
+    with results_open(name, 'r') as r_file:
+        for line in r_file:
+            fields = line.rstrip('\n').split('\t')
+            if len(fields) == 4:
+                yield fields
+
+
+def results_index(name):
+    # Hash of each URL -> hash of its headers hash and findings: a few dozen
+    # bytes per URL, whatever the size of the headers. The last result of a
+    # URL prevails (e.g. failed URLs analyzed again with '--resume').
+    return {hash(fields[0]): hash((fields[1], fields[3])) for fields in
+            results_lines(name)}
+
+
+def results_records(name, url_h):
+    return {fields[0]: fields[1:] for fields in results_lines(name) if
+            hash(fields[0]) in url_h}
+
+
+def diff_analysis(old_name, new_name):
+    # Hash join of two '--results' files on the URL: both are indexed by
+    # hashes (so unchanged URLs are never parsed), and only the records of
+    # the URLs added, removed or changed are read again, in a final pass.
+    old_i, new_i = results_index(old_name), results_index(new_name)
+    changed = {url_h for url_h, r_hash in new_i.items() if
+               old_i.get(url_h, r_hash) != r_hash}
+    old_r = results_records(old_name, changed | (old_i.keys() - new_i.keys()))
+    new_r = results_records(new_name, changed | (new_i.keys() - old_i.keys()))
+    totals = [Counter() for _ in range(5)]
+    diffs, changed_n = {}, [0, 0]
+    for url in sorted(old_r.keys() | new_r.keys()):
+        old, new = old_r.get(url), new_r.get(url)
+        diffs[url] = diff_target(old, new, totals, changed_n) if old and \
+            new else [f"{'-' if old else '+'} URL"]
+    print_diff(old_name, new_name, (len(old_i), len(new_i)), totals,
+               changed_n, diffs)
+
+
+def diff_target(old, new, totals, changed_n):
+    # Headers added (+), removed (-) or with other values (both), and the
+    # findings added or removed, as SECTION:FINDING (as in '--gate').
+    l_diff = [f"{sign} {get_detail(r[0], replace=True).strip()}" for sign, r
+              in (('-', old), ('+', new)) if r[0].startswith('[')]
+    old_h, new_h = (set(json.loads(r[1])) for r in (old, new))
+    names = [{line.partition(':')[0] for line in lines} for lines in
+             (old_h - new_h, new_h - old_h)]
+    totals[0].update(names[1] - names[0])
+    totals[1].update(names[0] - names[1])
+    totals[2].update(names[0] & names[1])
+    l_diff += [f"- {line}" for line in sorted(old_h - new_h)]
+    l_diff += [f"+ {line}" for line in sorted(new_h - old_h)]
+    old_f, new_f = ({f"{section}:{rule_text(rule_id(rule))}" for section,
+                     rules in zip(GATE_S, json.loads(r[2])) for rule in rules}
+                    for r in (old, new))
+    totals[3].update(new_f - old_f)
+    totals[4].update(old_f - new_f)
+    l_diff += [f"- {finding}" for finding in sorted(old_f - new_f)]
+    l_diff += [f"+ {finding}" for finding in sorted(new_f - old_f)]
+    changed_n[0] += old[0] != new[0]
+    changed_n[1] += old_f != new_f
+    return l_diff
+
+
+def print_diff(old_name, new_name, urls_n, totals, changed_n, diffs):
+    added = sum(l_diff == ["+ URL"] for l_diff in diffs.values())
+    removed = sum(l_diff == ["- URL"] for l_diff in diffs.values())
+    report = {get_detail('[diff_runs]', replace=True): f"{old_name} -> \
+{new_name}",
+              get_detail('[diff_urls]', replace=True): f"{urls_n[0]} / \
+{urls_n[1]}",
+              get_detail('[diff_added]', replace=True): added,
+              get_detail('[diff_removed]', replace=True): removed,
+              get_detail('[diff_changed]', replace=True): f"{changed_n[0]} / \
+{changed_n[1]}\n"}
+    print_analytics('[diff_report]', report, True)
+    for totals_n, totals_s in enumerate(('[diff_h_added]', '[diff_h_removed]',
+                                         '[diff_h_changed]', '[diff_f_added]',
+                                         '[diff_f_removed]')):
+        print_section(get_detail(totals_s, replace=True),
+                      totals[totals_n].most_common(FLEET_N))
+        print_w("")
+    print_detail('[diff_by_url]')
+    for url, l_diff in diffs.items():
+        print_w(f" {url}")
+        for line in l_diff:
+            print_w(f"  {line}")
+
+
+class ConsolidatedReport:
+    # One HTML/PDF document for all the URLs of a run. The report of each URL
+    # is appended to a temporary file as soon as it is analyzed (and its
+    # table of contents entry to another one), so only the totals are kept in
+    # memory; the document is assembled from both files at the end. They are
+    # created with the first URL and removed once the run ends, even if it
+    # is interrupted.
+    def __init__(self, name):
+        self.name = name
+        self.fmt = 'pdf' if name.lower().endswith('.pdf') else 'html'
+        self.body = self.toc = None
+        self.targets = self.failed = 0
+        self.totals = [0] * 5
+
+    def tmp_open(self):
+        if self.body is None:
+            self.body = open(f"{self.name}.body", 'w+', encoding='utf8')
+            self.toc = open(f"{self.name}.toc", 'w+', encoding='utf8')
+
+    def discard(self):
+        for tmp_f in (self.toc, self.body):
+            if tmp_f is not None:
+                tmp_f.close()
+                remove(tmp_f.name)
+        self.body = self.toc = None
+
+    def add(self, result, text='', headers=None, l_empty=()):
+        self.tmp_open()
+        self.targets += 1
+        if result.error:
+            self.failed += 1
+        else:
+            self.totals = [total + cnt for total, cnt in
+                           zip(self.totals, (*result.counts,
+                                             sum(result.counts)))]
+        result_s = target_text(str(result))
+        self.toc.write(f"{self.targets}\t{result.url}\t{result_s}\n")
+        if self.fmt == 'pdf':
+            self.body.write(f"\f{self.targets}\t{result.url}\n\n \
+{result_s}\n\n{text}")
+            return
+        self.body.write(f'<strong id="t{self.targets}">{self.targets}. \
+<a href="{result.url}">{result.url}</a></strong>\n\n {result_s}\n\n')
+        html_lines(text.splitlines(keepends=True), self.body, headers or {},
+                   l_empty)
+        self.body.write('\n')
+
+    def summary(self):
+        analyzed = (self.targets - self.failed) or 1
+        l_summary = [get_detail('[report_c]', replace=True), f" {now}", "",
+                     f"{get_detail('[fleet_urls]', replace=True)}: \
+{self.targets} ({self.failed})", "",
+                     get_detail('[report_avg]', replace=True)]
+        for literal, total in zip(('[miss_cnt]', '[finger_cnt]', '[ins_cnt]',
+                                   '[empty_cnt]', '[total_cnt]'),
+                                  self.totals):
+            l_summary.append(f"{get_detail(literal, replace=True)}\
+{total / analyzed:.1f}")
+        return l_summary + ["", get_detail('[report_toc]', replace=True), ""]
+
+    def finish(self):
+        self.tmp_open()
+        self.toc.seek(0)
+        self.body.seek(0)
+        if self.fmt == 'pdf':
+            self.finish_pdf()
+        else:
+            with open(self.name, 'w', encoding='utf8') as output:
+                output.write(html_header())
+                output.write('<body><pre>')
+                output.write(f"<strong>{self.summary()[0]}</strong>\n")
+                output.write('\n'.join(self.summary()[1:]) + '\n')
+                for line in self.toc:
+                    target_n, url, result_s = line.rstrip('\n').split('\t')
+                    output.write(f' <a href="#t{target_n}">{target_n}. \
+{url}</a> : {result_s}\n')
+                output.write('\n')
+                output.writelines(self.body)
+                output.write('</pre></body></html>')
+        self.discard()
+
+    def finish_pdf(self):
+        # Only the core PDF fonts are used, so nothing is embedded.
+        global pdf
+        pdf = PDF()
+        pdf.alias_nb_pages()
+        pdf_metadata(get_detail('[report_c]', replace=True))
+        pdf.set_display_mode(zoom='real')
+        pdf.add_page()
+        pdf.set_font("Courier", size=9)
+        l_summary = self.summary()
+        pdf.set_font(style='B')
+        pdf.multi_cell(197, 2.6, txt=l_summary[0], align='L')
+        pdf.set_font(style='')
+        for line in l_summary[1:]:
+            pdf.multi_cell(197, 2.6, txt=line, align='L')
+        links = []
+        for line in self.toc:
+            target_n, url, result_s = line.rstrip('\n').split('\t')
+            links.append(pdf.add_link())
+            pdf.cell(197, 2.6, txt=f" {target_n}. {url} : {result_s}",
+                     link=links[-1], new_x="LMARGIN", new_y="NEXT")
+        for line in self.body:
+            if line.startswith('\f'):
+                target_n, url = line[1:].rstrip('\n').split('\t')
+                pdf.add_page()
+                pdf.set_link(links[int(target_n) - 1])
+                pdf.start_section(f"{target_n}. {url}")
+                pdf.set_font(style='B')
+                pdf.multi_cell(197, 2.6, txt=f"{target_n}. {url}", align='L')
+            else:
+                pdf_lines((line,), level=1)
+        pdf.output(self.name)
+
+
+def consolidated_report():
+    with traced('export', 'write', file=report_c.name):
+        report_c.finish()
+    print_w("")
+    print_detail_l('[report]')
+    print_w(path.abspath(report_c.name))
+
+
+def target_keys(url):
+    url_s = urlsplit(url)
+    host = url_s.hostname or ''
+    keys = [('d', get_domain(url))]
+    with contextlib.suppress(OSError, UnicodeError, ValueError):
+        port = url_s.port or (80 if url_s.scheme == 'http' else 443)
+        keys.append(('ip', dns_resolve(host, port)[0]))
+    return keys
+
+
+def get_retry_after(headers):
+    retry_a = headers.get('Retry-After', '')
+    if retry_a.isdigit():
+        return int(retry_a)
+    with contextlib.suppress(TypeError, ValueError):
+        return max(0, parsedate_to_datetime(retry_a).timestamp() - time())
+    return 0
+
+
+def limited_fetch(limiter, url, cond_h=None):
+    # Throttled responses are not analyzed (they are the WAF/CDN headers, not
+    # the target ones); the URL is retrieved again after the backoff.
+    if id_error := fetch_blocked(url):
+        return {}, None, id_error
+    keys = target_keys(url)
+    for _ in range(QUEUE_A):
+        with traced('limiter', 'fetch'):
+            limiter.acquire(keys)
+        response = target_fetch(url, cond_h)
+        throttled, retry_a = fetch_throttled(response)
+        limiter.release(keys, throttled, retry_a)
+        if not throttled:
+            break
+    return limited_response(response, throttled)
+
+
+async def async_limited_fetch(limiter, url, cond_h=None):
+    # Same as 'limited_fetch()', for the event loop of '--async'; the DNS
+    # lookups are the only blocking calls, so they are run by its threads.
+    if id_error := fetch_blocked(url):
+        return {}, None, id_error
+    lane = tracer.lane() if tracer else None
+    try:
+        keys = await asyncio.to_thread(target_keys, url)
+        for _ in range(QUEUE_A):
+            with traced('limiter', 'fetch'):
+                await limiter.acquire_async(keys)
+            response = await async_target_fetch(url, cond_h)
+            throttled, retry_a = fetch_throttled(response)
+            limiter.release(keys, throttled, retry_a)
+            if not throttled:
+                break
+    finally:
+        if lane:
+            tracer.release(lane)
+    return limited_response(response, throttled)
+
+
+def fetch_throttled(response):
+    headers, status_c, _ = response
+    retry_a = get_retry_after(headers)
+    return status_c == 429 or status_c in CDN_E or \
+        (status_c == 503 and bool(retry_a)), retry_a
+
+
+def limited_response(response, throttled):
+    headers, status_c, id_error = response
+    if throttled and status_c == 429:
+        id_error = '[http_429]'
+    return compact_headers(headers), status_c, id_error
+
+
+def fetch_blocked(url):
+    # URLs not retrieved: Russian ones, after the '--deadline' or while the
+    # circuit of their host is open ('--breaker').
+    sffx = tldextract.extract(url).suffix[-2:].upper()
+    if sffx == 'RU' and sffx not in NON_RU_TLDS:
+        return '[bcnt]'
+    if deadline_t and time() >= deadline_t:
+        return '[e_deadline]'
+    return breaker.check(url) if breaker else None
+
+
+def target_fetch(url, cond_h=None):
+    if id_error := fetch_blocked(url):
+        return {}, None, id_error
+    start_f = time()
+    with traced(url, 'fetch') as t_args:
+        response = target_exceptions(url, cond_h)
+        t_args.update(status=response[1], error=response[2])
+    metrics.fetch(time() - start_f, response)
+    if breaker:
+        breaker.record(url, response[2])
+    return response
+
+
+async def async_target_fetch(url, cond_h=None):
+    if id_error := fetch_blocked(url):
+        return {}, None, id_error
+    start_f = time()
+    with traced(url, 'fetch') as t_args:
+        response = await async_exceptions(url, cond_h)
+        t_args.update(status=response[1], error=response[2])
+    metrics.fetch(time() - start_f, response)
+    if breaker:
+        breaker.record(url, response[2])
+    return response
+
+
+def target_analysis(url, response=None, snap=True):
+    # 'response' allows fetching the URLs concurrently while the analysis,
+    # which relies on the global 'URL', is performed one URL at a time. The
+    # report text is discarded as it is printed (only the findings are kept),
+    # unless it is added to the '--report' document. 'snap' stores its headers
+    # along with the history line, unless the caller writes that line.
+    global URL, rules_c
+    headers, _, id_error = response or target_fetch(url)
+    if id_error:
+        return target_failed(url, id_error)
+    URL, rules_c = url, []
+    headers = requests.structures.CaseInsensitiveDict(headers)
+    try:
+        with report_writer(MemoryWriter() if report_c else NullWriter()) as \
+                report, traced(url, 'analysis'):
+            with traced('1. missing', 'analysis'):
+                m_cnt = analysis_missing(headers)
+            ends = [len(rules_c)]
+            with traced('2. fingerprint', 'analysis'):
+                f_cnt = analysis_fingerprint(headers)
+            ends.append(len(rules_c))
+            with traced('3. insecure', 'analysis'):
+                i_cnt = analysis_insecure(headers)
+            ends.append(len(rules_c))
+            with traced('4. empty', 'analysis'):
+                e_cnt, l_empty = analysis_empty(headers)
+            if report_c:
+                with traced('5. compat', 'analysis'):
+                    analysis_compat(headers)
+    except Exception:
+        # Headers the analysis can not cope with fail only their URL (as
+        # those not retrieved), instead of the whole run.
+        rules_c = None
+        metrics.error('[e_analysis]')
+        return target_failed(url, '[e_analysis]')
+    metrics.scan(m_cnt, f_cnt, i_cnt[0], e_cnt)
+    result = TargetResult(url, (m_cnt, f_cnt, i_cnt[0], e_cnt), rules_c,
+                          ends)
+    rules_c = None
+    with traced('save', 'analysis'):
+        if report_c:
+            report_c.add(result, report.getvalue(), headers, l_empty)
+        if results_r:
+            results_r.add(result, headers)
+        if snaps and snap:
+            snaps.add(str(result).split(' ; ')[0], url, headers)
+    return result
+
+
+def target_failed(url, id_error):
+    result = TargetResult(url, error=id_error)
+    if report_c:
+        report_c.add(result)
+    if results_r:
+        results_r.add(result)
+    return result
+
+
+def target_text(result):
+    if result.startswith('['):
+        return get_detail(result, replace=True).strip()
+    return f"{get_detail('[total_cnt]', replace=True).strip()} \
+{result.split(' ; ')[-1]}"
+
+
+def print_target(url, result):
+    print_w(f" {url} : {target_text(result)}")
+
+
+def get_urls_file(urls_file):
+    # Read lazily, one line at a time; '-' reads the URLs from stdin.
+    with open(sys.stdin.fileno() if urls_file == '-' else urls_file, 'r',
+              encoding='utf8', closefd=urls_file != '-') as u_file:
+        for line in u_file:
+            if line.strip() and not line.startswith('#'):
+                yield line.strip()
+
+
+def bounded_map(executor, func, items, window_s):
+    # As 'executor.map()', but only submitting 'window_s' items ahead of the
+    # results consumed (backpressure), so 'items' can be a generator of any
+    # length; yields (item, result) pairs, in order.
+    pending = deque()
+    for item in items:
+        pending.append((item, executor.submit(func, item)))
+        if len(pending) >= window_s:
+            item_p, future = pending.popleft()
+            yield item_p, future_result(future)
+    while pending:
+        item_p, future = pending.popleft()
+        yield item_p, future_result(future)
+
+
+def future_result(future):
+    # With '--trace', the time waiting for the pool is shown (if any).
+    if not tracer or future.done():
+        return future.result()
+    with traced('wait', 'pool'):
+        return future.result()
+
+
+class AsyncExecutor:
+    # Runs the fetches of '--async' as coroutines of an event loop, in a
+    # thread of its own; 'submit()' returns a 'concurrent.futures.Future', as
+    # 'ThreadPoolExecutor' does, so both work with 'bounded_map()'.
+    def __init__(self, resolvers):
+        self.loop = asyncio.new_event_loop()
+        self.loop.set_default_executor(ThreadPoolExecutor(
+            max_workers=resolvers))
+        self.thread = threading.Thread(target=self.loop.run_forever,
+                                       daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        asyncio.run_coroutine_threadsafe(self.shutdown(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+    def submit(self, func, item):
+        return asyncio.run_coroutine_threadsafe(func(item), self.loop)
+
+    async def shutdown(self):
+        tasks = asyncio.all_tasks() - {asyncio.current_task()}
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self.loop.shutdown_default_executor()
+
+
+def fetch_pool(limiter):
+    # Threads retrieving the URLs, or the event loop of '--async'.
+    if args.async_f:
+        return AsyncExecutor(min(limiter.max_c, ASYNC_R)), \
+            partial(async_limited_fetch, limiter)
+    return ThreadPoolExecutor(max_workers=limiter.max_c), \
+        partial(limited_fetch, limiter)
+
+
+def queue_connect(queue_file):
+    # Default rollback journal instead of WAL, so the queue file can live on
+    # shared storage (NFS/SMB) accessed by workers on several machines.
+    conn = sqlite3.connect(queue_file, timeout=60, isolation_level=None)
+    conn.execute("CREATE TABLE IF NOT EXISTS queue (url TEXT PRIMARY KEY, \
+state TEXT DEFAULT 'pending', worker TEXT, lease REAL DEFAULT 0, attempts \
+INTEGER DEFAULT 0, result TEXT, saved INTEGER DEFAULT 0)")
+    conn.execute("CREATE INDEX IF NOT EXISTS queue_state ON queue (state, \
+lease)")
+    return conn
+
+
+def queue_add(conn, urls):
+    conn.execute('BEGIN IMMEDIATE')
+    n_urls = conn.total_changes
+    conn.executemany('INSERT OR IGNORE INTO queue (url) VALUES (?)',
+                     ((url,) for url in urls))
+    n_urls = conn.total_changes - n_urls
+    conn.execute('COMMIT')
+    return n_urls
+
+
+def queue_claim(conn, worker_id, lease_s):
+    # 'BEGIN IMMEDIATE' takes the write lock, so two workers can never claim
+    # the same URL; expired leases are claimed again by any worker.
+    lease_n = time()
+    conn.execute('BEGIN IMMEDIATE')
+    row = conn.execute("SELECT url FROM queue WHERE state = 'pending' OR \
+(state = 'leased' AND lease < ? AND attempts < ?) LIMIT 1",
+                       (lease_n, QUEUE_A)).fetchone()
+    if row:
+        conn.execute("UPDATE queue SET state = 'leased', worker = ?, lease = \
+?, attempts = attempts + 1 WHERE url = ?",
+                     (worker_id, lease_n + lease_s, row[0]))
+    conn.execute('COMMIT')
+    return row[0] if row else None
+
+
+def queue_post(conn, worker_id, url, result):
+    # Results from a worker whose lease has been re-issued are discarded.
+    state = result_state(result)
+    return conn.execute("UPDATE queue SET state = ?, result = ? WHERE url = ? \
+AND worker = ? AND state = 'leased'",
+                        (state, result, url, worker_id)).rowcount
+
+
+def result_state(result):
+    return 'failed' if result.startswith('[') else 'done'
+
+
+def queue_reissue(conn):
+    conn.execute("UPDATE queue SET state = CASE WHEN attempts >= ? THEN \
+'failed' ELSE 'pending' END, result = CASE WHEN attempts >= ? THEN \
+'[e_lease]' ELSE result END WHERE state = 'leased' AND lease < ?",
+                 (QUEUE_A, QUEUE_A, time()))
+
+
+def queue_save(conn):
+    conn.execute('BEGIN IMMEDIATE')
+    rows = conn.execute("SELECT result FROM queue WHERE state = 'done' AND \
+saved = 0").fetchall()
+    if rows:
+        with open(A_FILE, 'a+', encoding='utf8') as a_history:
+            a_history.writelines(f"{result}\n" for (result,) in rows)
+        conn.execute("UPDATE queue SET saved = 1 WHERE state = 'done' AND \
+saved = 0")
+    conn.execute('COMMIT')
+
+
+def queue_status(conn):
+    status = dict(conn.execute('SELECT state, COUNT(*) FROM queue GROUP BY \
+state').fetchall())
+    return [status.get(state, 0) for state in ('pending', 'leased', 'done',
+                                               'failed')]
+
+
+def queue_coordinator(queue_file, urls_file, lease_s):
+    conn = queue_connect(queue_file)
+    print_w("")
+    print_detail_l('[queue_add]')
+    print_w(queue_add(conn, get_urls_file(urls_file)))
+    print_detail('[queue_wait]')
+    last_s = None
+    while True:
+        queue_reissue(conn)
+        queue_save(conn)
+        status = queue_status(conn)
+        if status != last_s:
+            print_w(f"{get_detail('[queue_status]', replace=True)}\
+{' / '.join(str(cnt) for cnt in status)}")
+            last_s = status
+        if not (status[0] or status[1]):
+            break
+        sleep(min(QUEUE_P, lease_s))
+    queue_failed(conn)
+    print_w("")
+    print_detail_l('[queue_done]')
+    print_w(path.abspath(A_FILE))
+
+
+def queue_failed(conn):
+    rows = conn.execute("SELECT url, result FROM queue WHERE state = \
+'failed' ORDER BY url")
+    for row_n, (url, result) in enumerate(rows):
+        if not row_n:
+            print_w("")
+            print_detail('[queue_failed]')
+        print_target(url, result)
+
+
+def queue_worker(queue_file, lease_s):
+    conn = queue_connect(queue_file)
+    worker_id = f"{socket.gethostname()}-{getpid()}"
+    print_w("")
+    print_detail_l('[queue_worker]')
+    print_w(worker_id)
+    while True:
+        if url := queue_claim(conn, worker_id, lease_s):
+            result = str(target_analysis(url))
+            if queue_post(conn, worker_id, url, result):
+                print_target(url, result)
+            snaps.flush()
+            metrics.save()
+        elif any(queue_status(conn)[:2]):
+            sleep(QUEUE_P)
+        else:
+            break
+    metrics.save(force=True)
+    print_w("")
+    print_detail('[queue_empty]')
+
+
+def batch_resume(conn, retry_p):
+    # URLs leased by an interrupted run are analyzed again, along with the
+    # failed ones allowed by the retry policy.
+    conn.execute("UPDATE queue SET state = 'pending' WHERE state = 'leased'")
+    if retry_p == 'all':
+        conn.execute("UPDATE queue SET state = 'pending' WHERE state = \
+'failed'")
+    elif retry_p == 'transient':
+        conn.execute("UPDATE queue SET state = 'pending' WHERE state = \
+'failed' AND (result IN ('[e_404]', '[e_circuit]', '[e_deadline]', \
+'[e_lease]', '[e_request]', '[e_serror]', '[e_timeout]', '[http_429]') OR \
+result LIKE '[server_%')")
+
+
+def batch_flush(conn, results):
+    # One transaction per batch of results, so checkpointing costs a few
+    # writes per second regardless of the number of URLs analyzed.
+    with traced('history', 'write', lines=len(results)):
+        if results:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.executemany("UPDATE queue SET state = ?, result = ?, \
+attempts = attempts + 1 WHERE url = ?", ((result_state(str(result)),
+                                          str(result), url) for url, result in
+                                         results))
+            conn.execute('COMMIT')
+            queue_save(conn)
+            results.clear()
+        snaps.flush()
+    metrics.save()
+
+
+def batch_pending(conn):
+    # Pending URLs read from the checkpoint in pages, as they are analyzed.
+    rowid = 0
+    while rows := conn.execute("SELECT rowid, url FROM queue WHERE state = \
+'pending' AND rowid > ? ORDER BY rowid LIMIT ?", (rowid, CKPT_N)).fetchall():
+        rowid = rows[-1][0]
+        yield from (url for _, url in rows)
+
+
+def stream_flush(l_history):
+    with traced('history', 'write', lines=len(l_history)):
+        if l_history:
+            with open(A_FILE, 'a+', encoding='utf8') as a_history:
+                a_history.writelines(l_history)
+            l_history.clear()
+        snaps.flush()
+    metrics.save()
+
+
+def stream_analysis(urls_file, limiter):
+    # Without a checkpoint: the URLs are read, retrieved, analyzed, shown and
+    # saved as a pipeline of bounded stages, so memory does not grow with
+    # the number of URLs (e.g. millions of them from stdin).
+    print_w("")
+    l_history, flush_t = [], time()
+    executor, fetch = fetch_pool(limiter)
+    try:
+        with executor:
+            for url, response in bounded_map(
+                    executor, fetch, get_urls_file(urls_file),
+                    limiter.max_c * 2):
+                result = target_analysis(url, response)
+                if fleet:
+                    fleet.add(result)
+                result = str(result)
+                print_target(url, result)
+                if not result.startswith('['):
+                    l_history.append(f"{result}\n")
+                if len(l_history) >= CKPT_N or time() - flush_t >= CKPT_S:
+                    stream_flush(l_history)
+                    flush_t = time()
+    finally:
+        stream_flush(l_history)
+        metrics.save(force=True)
+    if fleet:
+        fleet_report(args.fleet)
+    if report_c:
+        consolidated_report()
+    if results_r:
+        results_r.close()
+    print_w("")
+    print_detail_l('[batch_done]')
+    print_w(path.abspath(A_FILE))
+
+
+def batch_analysis(urls_file, checkpoint_file, limiter, resume, retry_p):
+    conn = queue_connect(checkpoint_file)
+    if not resume:
+        conn.execute('DELETE FROM queue')
+    queue_add(conn, get_urls_file(urls_file))
+    batch_resume(conn, retry_p)
+    print_w("")
+    print_detail_l('[batch_pending]')
+    print_w(conn.execute("SELECT COUNT(*) FROM queue WHERE state = \
+'pending'").fetchone()[0])
+    print_w("")
+    results, flush_t = [], time()
+    executor, fetch = fetch_pool(limiter)
+    try:
+        with executor:
+            for url, response in bounded_map(
+                    executor, fetch, batch_pending(conn), limiter.max_c * 2):
+                result = target_analysis(url, response)
+                if fleet:
+                    fleet.add(result)
+                results.append((url, result))
+                print_target(url, str(result))
+                if len(results) >= CKPT_N or time() - flush_t >= CKPT_S:
+                    batch_flush(conn, results)
+                    flush_t = time()
+    finally:
+        batch_flush(conn, results)
+        metrics.save(force=True)
+    queue_failed(conn)
+    if fleet:
+        fleet_report(args.fleet)
+    if report_c:
+        consolidated_report()
+    if results_r:
+        results_r.close()
+    print_w("")
+    print_detail_l('[batch_done]')
+    print_w(path.abspath(A_FILE))
+
+
+def sweep_urls(origin, paths_file):
+    # E.g. '/login' or 'api/users?id=1', relative to the origin.
+    for path_s in get_urls_file(paths_file):
+        yield f"{origin}/{path_s.lstrip('/')}"
+
+
+def sweep_analysis(origin, paths_file, limiter):
+    # The paths are retrieved concurrently through the pooled connections to
+    # the origin; those with the same headers (see 'watch_hash') share a
+    # configuration, which is analyzed only once.
+    origin = '{0.scheme}://{0.netloc}'.format(urlsplit(origin))
+    configs, failed = {}, defaultdict(list)
+    with ThreadPoolExecutor(max_workers=limiter.max_c) as executor:
+        for url, response in bounded_map(
+                executor, partial(limited_fetch, limiter),
+                sweep_urls(origin, paths_file), limiter.max_c * 2):
+            path_s = url.split('/', 3)[3]
+            if response[2]:
+                failed[response[2]].append(f"/{path_s}")
+                continue
+            hash_n = watch_hash(requests.structures.CaseInsensitiveDict(
+                response[0]))
+            if hash_n not in configs:
+                configs[hash_n] = (target_analysis(url, response), [])
+            configs[hash_n][1].append(f"/{path_s}" if response[1] == 200 else
+                                      f"/{path_s} ({response[1]})")
+    metrics.save(force=True)
+    print_sweep(origin, sorted(configs.values(), key=lambda c: -len(c[1])),
+                failed)
+
+
+def print_sweep(origin, configs, failed):
+    # Configurations by number of paths; the findings of each one are
+    # compared with those of the most common one.
+    print_w("")
+    print_w(f"{Style.BRIGHT}{get_detail('[sweep_analysis]', replace=True)} \
+{origin}{Style.RESET_ALL}")
+    findings_c = set(configs[0][0].findings()) if configs else set()
+    for config_n, (result, paths) in enumerate(configs, 1):
+        print_w("")
+        print_w(f"{Style.BRIGHT}{get_detail('[sweep_config]', replace=True)} \
+{config_n}: {len(paths)}{get_detail('[sweep_paths]', replace=True)} ; \
+{target_text(str(result))}{Style.RESET_ALL}")
+        findings = result.findings()
+        for id_mode, l_diff in (('[sweep_more]', [finding for finding in
+                                                  findings if finding not in
+                                                  findings_c]),
+                                ('[sweep_less]', sorted(findings_c -
+                                                        set(findings)))):
+            if l_diff:
+                print_w(f" {get_detail(id_mode, replace=True)} \
+{', '.join(dict.fromkeys(l_diff))}")
+        for path_s in paths:
+            print_w(f"  {path_s}")
+    for id_error, paths in failed.items():
+        print_w("")
+        print_w(f"{Style.BRIGHT}{target_text(id_error)}{Style.RESET_ALL}")
+        for path_s in paths:
+            print_w(f"  {path_s}")
+    print_w("")
+
+
+def watch_hash(headers):
+    return hashlib.sha1('\n'.join(watch_lines(headers)).encode()).hexdigest()
+
+
+def watch_lines(headers):
+    # Only the analysis-relevant part of the headers: values that change on
+    # every response (dates, request ids, the values and expiry dates of
+    # cookies) are left out; the rest of the cookie attributes are kept.
+    l_hash = []
+    for key, value in headers.items():
+        key = key.lower()
+        if key == 'set-cookie':
+            value = ' '.join(sorted({
+                f"{name}={ck_value.strip()}" if ck_value and name !=
+                'expires' else name for name, ck_value in re.findall(
+                    r';\s*([\w-]+)(?:\s*=\s*([^;,]*))?', value.lower())}))
+        elif key in WATCH_V:
+            value = ''
+        l_hash.append(f"{key}: {value}")
+    return sorted(l_hash)
+
+
+def watch_conditional(etag, modified, checks):
+    # A change in the server config does not change the ETag/Last-Modified of
+    # the content, so every 'WATCH_F' checks the response is fully retrieved.
+    if not checks % WATCH_F:
+        return None
+    cond_h = {}
+    if etag:
+        cond_h['If-None-Match'] = etag
+    if modified:
+        cond_h['If-Modified-Since'] = modified
+    return cond_h or None
+
+
+def watch_update(row, response):
+    # Unchanged targets (304 or same headers hash) are neither analyzed nor
+    # saved to the history.
+    url, etag, modified, hash_p, result_p, _, findings_p = row
+    _, status_c, id_error = response
+    if status_c == 304 and result_p:
+        return etag, modified, hash_p, result_p, findings_p
+    if id_error:
+        return None, None, None, id_error, id_error
+    headers = requests.structures.CaseInsensitiveDict(response[0])
+    hash_n = watch_hash(headers)
+    if hash_n == hash_p:
+        return headers.get('ETag'), headers.get('Last-Modified'), hash_n, \
+            result_p, findings_p
+    result = target_analysis(url, response, snap=False)
+    findings = result.error or json.dumps([sorted(rules) for rules in
+                                           result.rule_names()])
+    return headers.get('ETag'), headers.get('Last-Modified'), hash_n, \
+        str(result), findings
+
+
+def get_gate(gate_s):
+    # E.g. 'missing=5,insecure=0,missing:Content-Security-Policy': maximum
+    # warnings of each section ('total' for all of them) and findings that
+    # must not be present ('section:header').
+    limits, findings = {}, []
+    for term in (term.strip() for term in gate_s.split(',')):
+        key, sep, value = term.partition('=')
+        section, _, name = term.partition(':')
+        if sep and key in GATE_S + ['total'] and value.isdigit():
+            limits[key] = int(value)
+        elif name and section in GATE_S:
+            findings.append((section, name.strip().lower()))
+        else:
+            parser.error(f"'--gate' terms must be SECTION=N or \
+SECTION:HEADER, where SECTION is {', '.join(GATE_S)} (or 'total' for \
+SECTION=N) ('{term}').")
+    return limits, findings
+
+
+def gate_analysis(url, limits, findings):
+    # Only the sections needed by the policy are run, without showing them or
+    # saving them to the history: exits with 0 (passed), 1 (failed) or 3
+    # (the URL could not be analyzed).
+    global rules_c
+    headers, _, id_error = target_fetch(url)
+    if id_error:
+        print_w(get_detail(id_error, replace=True).strip())
+        sys.exit(3)
+    headers = requests.structures.CaseInsensitiveDict(headers)
+    needed = GATE_S if 'total' in limits else set(limits) | {
+        section for section, _ in findings}
+    counts, rules = {}, {}
+    with report_writer(NullWriter()):
+        for section, func in zip(GATE_S, (analysis_missing,
+                                          analysis_fingerprint,
+                                          analysis_insecure, analysis_empty)):
+            if section in needed:
+                rules_c = []
+                cnt = func(headers)
+                counts[section] = cnt[0] if isinstance(cnt, (list, tuple)) \
+                    else cnt
+                rules[section] = rules_c
+    rules_c = None
+    counts['total'] = sum(counts.values())
+    failed = [f"{section}: {counts[section]} > {limit}" for section, limit in
+              limits.items() if counts[section] > limit]
+    failed += [f"{section}:{name}" for section, name in findings if any(
+        rule_text(rule_n).lower().startswith(name) for rule_n in
+        rules[section])]
+    for failed_s in failed:
+        print_w(failed_s)
+    sys.exit(1 if failed else 0)
+
+
+def print_change(url, result_p, result, findings_p, findings):
+    date_c = datetime.now().strftime("%Y/%m/%d - %H:%M:%S")
+    if result_p:
+        print_w(f" {date_c} ; {url} : {target_text(result_p)} -> \
+{target_text(result)}")
+    else:
+        print_w(f" {date_c} ; {url} : {target_text(result)}")
+    if findings_p and not (result_p.startswith('[') or
+                           result.startswith('[')):
+        # The findings removed (-) and added (+), as in '--diff'.
+        old_f, new_f = ({f"{section}:{rule_text(rule_id(rule))}" for
+                         section, rules in zip(GATE_S, json.loads(f_json))
+                         for rule in rules} for f_json in
+                        (findings_p, findings))
+        for finding in sorted(old_f - new_f):
+            print_w(f"   - {finding}")
+        for finding in sorted(new_f - old_f):
+            print_w(f"   + {finding}")
+
+
+def watch_urls(conn, urls_file):
+    urls = list(get_urls_file(urls_file))
+    conn.execute('BEGIN IMMEDIATE')
+    conn.executemany('INSERT OR IGNORE INTO watch (url) VALUES (?)',
+                     ((url,) for url in urls))
+    l_urls = set(urls)
+    conn.executemany('DELETE FROM watch WHERE url = ?',
+                     ((url,) for (url,) in conn.execute('SELECT url FROM \
+watch').fetchall() if url not in l_urls))
+    conn.execute('COMMIT')
+    return len(l_urls)
+
+
+def watch_save(conn, rows, responses, watch_s):
+    l_history = []
+    conn.execute('BEGIN IMMEDIATE')
+    for row, response in zip(rows, responses):
+        url, result_p, findings_p = row[0], row[4], row[6]
+        etag, modified, hash_n, result, findings = watch_update(row,
+                                                                response)
+        # By the findings of each section (or the error), so a finding
+        # replaced by another one is a change even with the same counts.
+        if findings != findings_p:
+            print_change(url, result_p, result, findings_p, findings)
+            if not result.startswith('['):
+                l_history.append(f"{result}\n")
+                snaps.add(result.split(' ; ')[0], url,
+                          requests.structures.CaseInsensitiveDict(
+                              response[0]))
+        conn.execute("UPDATE watch SET etag = ?, modified = ?, hash = ?, \
+result = ?, findings = ?, due = ?, checks = checks + 1 WHERE url = ?",
+                     (etag, modified, hash_n, result, findings,
+                      time() + watch_s, url))
+    if l_history:
+        with open(A_FILE, 'a+', encoding='utf8') as a_history:
+            a_history.writelines(l_history)
+    conn.execute('COMMIT')
+    snaps.flush()
+    metrics.save()
+
+
+def watch_analysis(urls_file, checkpoint_file, limiter, watch_s):
+    # Runs until interrupted: the stalest URLs are checked first, reusing the
+    # connections, and only the changes in the findings are shown and saved.
+    conn = queue_connect(checkpoint_file)
+    conn.execute("CREATE TABLE IF NOT EXISTS watch (url TEXT PRIMARY KEY, \
+etag TEXT, modified TEXT, hash TEXT, result TEXT, findings TEXT, due REAL \
+DEFAULT 0, checks INTEGER DEFAULT 0)")
+    print_w("")
+    print_detail_l('[watch_start]')
+    print_w(f"{watch_urls(conn, urls_file)} / {watch_s}s")
+    print_w("")
+    try:
+        with ThreadPoolExecutor(max_workers=limiter.max_c) as executor:
+            while True:
+                rows = conn.execute("SELECT url, etag, modified, hash, \
+result, checks, findings FROM watch WHERE due <= ? ORDER BY due LIMIT ?",
+                                    (time(), CKPT_N)).fetchall()
+                if not rows:
+                    next_d = conn.execute('SELECT MIN(due) FROM \
+watch').fetchone()[0]
+                    sleep(max(QUEUE_P, (next_d or 0) - time()))
+                    continue
+                responses = executor.map(
+                    partial(limited_fetch, limiter),
+                    [row[0] for row in rows],
+                    [watch_conditional(*row[1:3], row[5]) for row in rows])
+                watch_save(conn, rows, responses, watch_s)
+    except KeyboardInterrupt:
+        print_w("")
+        print_detail_l('[watch_stop]')
+        print_w(path.abspath(A_FILE))
+
+
+def get_headers_text(headers_t):
+    # 'Name: value' lines, as shown by browsers or 'curl -I'; repeated headers
+    # are combined, as 'requests' does.
+    headers_d = requests.structures.CaseInsensitiveDict()
+    for line in headers_t.splitlines():
+        key, sep, value = line.partition(':')
+        if sep and key.strip() and ' ' not in key.strip():
+            headers_d.setdefault(key.strip(), []).append(value.strip())
+    return cap_headers(requests.structures.CaseInsensitiveDict(
+        {key: ', '.join(values) for key, values in headers_d.items()}))
+
+
+def daemon_report(url, response, params, start_r):
+    # The analysis relies on globals, so only one report is built at a time
+    # (into its own writer); the fetches are performed concurrently by the
+    # pool.
+    global URL, headers, status_code, start, now, details_f, rules_c
+    headers, status_code, id_error = response
+    # The options of the daemon are restored even if the analysis fails.
+    daemon_o = URL, args.lang, args.brief, args.ret
+    try:
+        args.lang = params.get('lang') or None
+        args.brief = params.get('brief') == '1'
+        args.ret = params.get('ret') == '1'
+        if args.lang not in details_d:
+            details_d[args.lang] = get_details_lines()
+        details_f = details_d[args.lang]
+        URL, start, rules_c = url, start_r, []
+        now = datetime.now().strftime("%Y/%m/%d - %H:%M:%S")
+        with report_writer(MemoryWriter()) as report:
+            if id_error:
+                clean_output()
+                print_w("")
+                print_detail(id_error)
+                result = TargetResult(url, error=id_error)
+            else:
+                analysis_report()
+                metrics.scan(m_cnt, f_cnt, i_cnt[0], e_cnt)
+                result = TargetResult(url, (m_cnt, f_cnt, i_cnt[0], e_cnt),
+                                      rules_c)
+        reply = {'url': url, 'result': str(result),
+                 'findings': result.findings(), 'report': report.getvalue()}
+    finally:
+        URL, args.lang, args.brief, args.ret = daemon_o
+        rules_c, details_f = None, details_d[args.lang]
+    print_target(url, reply['result'])
+    return reply
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if urlsplit(self.path).path != '/metrics':
+            return self.daemon_reply(404, {'error': 'GET /metrics'})
+        body = metrics.export().encode('utf8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def daemon_reply(self, status_c, reply):
+        body = json.dumps(reply).encode('utf8')
+        self.send_response(status_c)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *log_args):
+        pass
+
+
+class DaemonHandler(MetricsHandler):
+    # GET /analyze?url=URL retrieves and analyzes the URL; POST /headers?url=
+    # URL analyzes the headers sent as the body ('Name: value' lines). Both
+    # accept 'brief=1', 'ret=1' and 'lang=es', as '-b', '-r' and '-l es'.
+    def do_GET(self):
+        if urlsplit(self.path).path == '/metrics':
+            return super().do_GET()
+        self.daemon_request('/analyze')
+
+    def do_POST(self):
+        self.daemon_request('/headers')
+
+    def daemon_request(self, path_r):
+        start_r = time()
+        url_s = urlsplit(self.path)
+        params = dict(parse_qsl(url_s.query))
+        if url_s.path != path_r or not params.get('url'):
+            return self.daemon_reply(404, {'error': 'GET /analyze?url=URL or \
+POST /headers?url=URL'})
+        if path_r == '/headers':
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            response = get_headers_text(body.decode('utf8', 'replace')), \
+                None, None
+        else:
+            response = target_fetch(params['url'])
+        try:
+            with daemon_lock:
+                reply = daemon_report(params['url'], response, params,
+                                      start_r)
+        except Exception:
+            # Headers the analysis can not cope with fail only this request.
+            metrics.error('[e_analysis]')
+            print_target(params['url'], '[e_analysis]')
+            return self.daemon_reply(500, {'url': params['url'], 'error':
+                                           get_detail('[e_analysis]',
+                                                      replace=True).strip()})
+        return self.daemon_reply(200, reply)
+
+
+class DaemonServer(HTTPServer):
+    # Each connection is handled by a bounded pool of threads, instead of
+    # one new thread per connection.
+    def __init__(self, address, pool_s, handler=DaemonHandler):
+        self.address_family = socket.AF_UNIX if isinstance(address, str) \
+            else socket.AF_INET6 if ':' in address[0] else socket.AF_INET
+        self.pool = ThreadPoolExecutor(max_workers=pool_s)
+        super().__init__(address, handler)
+
+    def server_bind(self):
+        if self.address_family != socket.AF_UNIX:
+            return super().server_bind()
+        with contextlib.suppress(FileNotFoundError):
+            remove(self.server_address)
+        self.socket.bind(self.server_address)
+        self.server_name, self.server_port = self.server_address, 0
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self.pool_request, request, client_address)
+
+    def service_actions(self):
+        # Between requests (every half a second at most): '--metrics-file'
+        # of the daemon, which 'metrics.save()' writes every CKPT_S seconds.
+        if self.RequestHandlerClass is DaemonHandler:
+            metrics.save()
+
+    def pool_request(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+
+class UnixConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path):
+        super().__init__('localhost')
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.socket_path)
+
+
+def get_daemon_address(address):
+    # HOST:PORT, or the path of a Unix socket.
+    host, sep, port = address.rpartition(':')
+    if sep and port.isdigit() and '/' not in address:
+        return host.strip('[]') or '127.0.0.1', int(port)
+    return address
+
+
+def daemon_analysis(address, pool_s):
+    server = DaemonServer(get_daemon_address(address), pool_s)
+    print_w("")
+    print_detail_l('[daemon_start]')
+    print_w(address)
+    print_w("")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print_w("")
+        print_detail_l('[daemon_stop]')
+        print_w(path.abspath(A_FILE))
+    finally:
+        server.server_close()
+        server.pool.shutdown(cancel_futures=True)
+        metrics.save(force=True)
+        if server.address_family == socket.AF_UNIX:
+            remove(server.server_address)
+
+
+def metrics_server(address):
+    # '/metrics' endpoint for long runs ('--daemon' also serves it on its own
+    # address).
+    server = DaemonServer(get_daemon_address(address), 2, MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+
+def daemon_client(address):
+    # Returns False if no daemon is listening on 'address', so the analysis
+    # is performed locally instead.
+    d_address = get_daemon_address(address)
+    conn = UnixConnection(d_address) if isinstance(d_address, str) else \
+        http.client.HTTPConnection(*d_address)
+    params = urlencode({'url': URL, 'brief': int(args.brief),
+                        'ret': int(args.ret), 'lang': args.lang or ''})
+    try:
+        conn.request('GET', f"/analyze?{params}")
+        reply = json.loads(conn.getresponse().read())
+    except (OSError, http.client.HTTPException, ValueError):
+        return False
+    finally:
+        conn.close()
+    # E.g. the error of an analysis that failed in the daemon: analyzed
+    # locally.
+    if 'report' not in reply:
+        return False
+    print_w(reply['report'], end='')
+    return True
 
 
 init(autoreset=True)
+tty_w, writers = TtyWriter(), threading.local()
+details_i = {}
 
 parser = ArgumentParser(formatter_class=RawDescriptionHelpFormatter,
                         description=PRG_N + GIT_U)
@@ -814,6 +4245,167 @@ analyze. E.g. https://google.com")
 parser.add_argument("-v", "--version", action="store_true",
                     help="show the version of this tool and check for \
 updates")
+parser.add_argument("--async", dest='async_f', action="store_true",
+                    help="retrieve the URLs from '--urls' with an event loop \
+instead of threads, reading only the status line and headers of each \
+response (so '--concurrency' can be in the thousands)")
+parser.add_argument("--breaker", type=int, dest='breaker', nargs='?',
+                    const=BREAK_T, metavar='SECONDS', help="stop retrieving \
+the URLs of a host after 3 consecutive timeouts or connection errors, \
+reporting them as failed at once, for SECONDS (default: 300); saved to \
+'analysis_h.cache', so it also applies to the next runs")
+parser.add_argument("--cache", type=int, dest='cache', nargs='?',
+                    const=CACHE_T, metavar='SECONDS', help="reuse the \
+response to '-u URL' if it was retrieved less than SECONDS ago (default: \
+600), e.g. to show its analysis with other options without retrieving it \
+again; otherwise, it is retrieved and saved")
+parser.add_argument("--checkpoint", type=str, dest='checkpoint',
+                    metavar='FILE', help="SQLite file to save the progress of \
+the analysis of '--urls' (if omitted, 'URLS_FILE.checkpoint')")
+parser.add_argument("--compact", type=str, dest='compact', metavar='POLICY',
+                    help="move old analyses from 'analysis_h.txt' to \
+compressed archives, which are also used by '-a' and '--trends' (e.g. \
+'days=30,last=10,daily,drop=365': analyses older than 30 days or than the \
+10 latest of each URL are archived as daily averages, and deleted after 365 \
+days)")
+parser.add_argument("--concurrency", type=int, dest='concurrency', default=10,
+                    metavar='N', help="maximum number of URLs from '--urls' \
+(or paths from '--paths') retrieved at the same time (default: 10)")
+parser.add_argument("--connect", type=str, dest='connect', metavar='ADDRESS',
+                    help="send the analysis of '-u URL' to the '--daemon' \
+listening on ADDRESS (if it is not running, humble analyzes it as usual)")
+parser.add_argument("--coordinator", dest='coordinator', action="store_true",
+                    help="distribute the analysis of the URLs from '--urls' \
+through the '--queue' file and wait for the workers to finish")
+parser.add_argument("--daemon", type=str, dest='daemon', metavar='ADDRESS',
+                    help="keep running, analyzing the URLs requested on \
+ADDRESS (HOST:PORT or a Unix socket path) through a local HTTP API")
+parser.add_argument("--deadline", type=float, dest='deadline',
+                    metavar='SECONDS', help="maximum time to retrieve the \
+URLs from '--urls' (or the paths from '--paths'); those not retrieved by then \
+are reported as failed, and can be analyzed later with '--resume'")
+parser.add_argument("--diff", type=str, dest='diff', nargs=2,
+                    metavar=('OLD', 'NEW'), help="show the differences \
+between two '--results' files (e.g. yesterday's and today's runs): URLs added \
+and removed, and headers and warnings added, removed or changed, by URL and \
+in total")
+parser.add_argument("--dns-ttl", type=int, dest='dns_ttl', default=300,
+                    metavar='SECONDS', help="time the DNS lookups are cached \
+and shared between requests (default: 300)")
+parser.add_argument("--domain", type=str, dest='domain', metavar='DOMAIN',
+                    help="show statistics ('-a') only of the URLs of the \
+registered domain DOMAIN (e.g. 'example.com': any scheme, subdomain and path)")
+parser.add_argument("--fleet", type=str, dest='fleet', metavar='FILE',
+                    help="show an aggregate report of the URLs analyzed from \
+'--urls' (most frequent findings and registered domains with most warnings) \
+and save it, complete, to FILE as CSV")
+parser.add_argument("--gate", type=str, dest='gate', metavar='POLICY',
+                    help="only check '-u URL' against POLICY (e.g. \
+'missing=5,insecure=0,fingerprint:Server'), for CI: shows only what fails \
+and exits with 0 (passed), 1 (failed) or 3 (URL not analyzed)")
+parser.add_argument("--glob", type=str, dest='glob', metavar='PATTERN',
+                    help="show statistics ('-a') only of the URLs matching \
+PATTERN: of their host if it has no scheme (e.g. '*.example.com'), of the \
+whole URL otherwise (e.g. 'https://*.example.com/api/*')")
+parser.add_argument("--lease", type=int, dest='lease', default=60,
+                    metavar='SECONDS', help="time given to a worker to \
+analyze a URL before it is re-issued to another one (default: 60)")
+parser.add_argument("--max-headers", type=int, dest='max_headers',
+                    default=HDR_N, metavar='N', help="maximum number of \
+headers of a response that are analyzed, to bound the time of the analysis \
+whatever the server sends; the rest are ignored (default: 500)")
+parser.add_argument("--max-length", type=int, dest='max_length',
+                    default=HDR_L, metavar='N', help="maximum number of \
+characters of each header value that are analyzed; the rest are ignored \
+(default: 32768)")
+parser.add_argument("--metrics", type=str, dest='metrics', metavar='ADDRESS',
+                    help="serve Prometheus metrics (scans, fetch latency, \
+errors and findings) on ADDRESS/metrics while analyzing '--urls', as a \
+'--worker' or as a '--daemon'")
+parser.add_argument("--metrics-file", type=str, dest='metrics_file',
+                    metavar='FILE', help="save Prometheus metrics to FILE \
+while analyzing '--urls' or as a '--worker' (e.g. for the textfile collector \
+of node_exporter)")
+parser.add_argument("--paths", type=str, dest='paths', metavar='FILE',
+                    help="retrieve the paths in FILE (one per line, '-' for \
+stdin) from the origin of '-u URL', showing which ones share the same \
+headers and the analysis of each distinct set of them")
+parser.add_argument("--queue", type=str, dest='queue', metavar='FILE',
+                    help="SQLite file (e.g. on shared storage) with the URLs \
+to be analyzed by the workers")
+parser.add_argument("--rate", type=float, dest='rate', default=5,
+                    metavar='RPS', help="maximum requests per second to the \
+same registered domain when analyzing '--urls' or '--paths' (default: 5; 0 = \
+unlimited)")
+parser.add_argument("--rate-ip", type=float, dest='rate_ip', default=10,
+                    metavar='RPS', help="maximum requests per second to the \
+same IP address when analyzing '--urls' or '--paths' (default: 10; 0 = \
+unlimited)")
+parser.add_argument("--series", type=str, dest='series', metavar='FILE',
+                    help="save the history of analysis as CSV time series per \
+URL, with rolling averages (only of '-u URL' if indicated)")
+parser.add_argument("--since", type=str, dest='since', metavar='DATE',
+                    help="show statistics ('-a') only of the analysis \
+performed since DATE (YYYY/MM/DD)")
+parser.add_argument("--reanalyze", dest='reanalyze', action="store_true",
+                    help="analyze again with the current rules, without \
+retrieving them, the URLs of the history whose headers were saved (to \
+'analysis_h.snap'), updating their results")
+parser.add_argument("--refresh", dest='refresh', action="store_true",
+                    help="retrieve '-u URL' again, updating the response \
+saved by '--cache'")
+parser.add_argument("--replay", dest='replay', action="store_true",
+                    help="analyze the response to '-u URL' saved by \
+'--cache', whatever its age and without retrieving it (e.g. offline)")
+parser.add_argument("--report", type=str, dest='report', metavar='FILE',
+                    help="save the analysis of all the URLs from '--urls' to \
+a single HTML or PDF (by its extension) FILE, with a summary and a table of \
+contents")
+parser.add_argument("--results", type=str, dest='results', metavar='FILE',
+                    help="save the headers and warnings of each URL from \
+'--urls' to FILE (compressed if it ends with '.gz'), to compare runs with \
+'--diff'")
+parser.add_argument("--resolve", type=str, dest='resolve', action='append',
+                    metavar='HOST:PORT:IP', help="connect to IP instead of \
+resolving HOST:PORT, keeping HOST in the 'Host' header and TLS SNI (like \
+curl's '--resolve'; can be repeated)")
+parser.add_argument("--resume", dest='resume', action="store_true",
+                    help="resume the analysis of '--urls' from its \
+'--checkpoint', skipping the URLs already analyzed")
+parser.add_argument("--retries", type=int, dest='retries', default=0,
+                    metavar='N', help="times a URL is retrieved again after \
+a timeout or connection error, waiting a random and increasing time between \
+attempts (default: 0)")
+parser.add_argument("--retry", dest='retry', default='transient',
+                    choices=['all', 'none', 'transient'], help="failed URLs \
+to analyze again with '--resume'; 'transient' are timeouts, connection and \
+server errors, and those not retrieved due to '--breaker' or '--deadline' \
+(default: transient)")
+parser.add_argument("--timeout", type=str, dest='timeout', default='15',
+                    metavar='CONNECT[,READ]', help="seconds to wait for the \
+connection to a URL and for its response (default: 15)")
+parser.add_argument("--trace", type=str, dest='trace', metavar='FILE',
+                    help="save to FILE a timeline of the retrieval (DNS, \
+connection, TLS, headers) and analysis (by section) of each URL from \
+'--urls' or '--paths' or as a '--worker', and of the writes to the history \
+and reports, to open in Perfetto or chrome://tracing")
+parser.add_argument("--trends", dest='trends', action="store_true",
+                    help="show trends of the analysis performed: percentiles, \
+rolling/monthly averages and largest increases of warnings (of '-u URL' if \
+indicated)")
+parser.add_argument("--until", type=str, dest='until', metavar='DATE',
+                    help="show statistics ('-a') only of the analysis \
+performed until DATE (YYYY/MM/DD, included)")
+parser.add_argument("--urls", type=str, dest='urls', metavar='FILE',
+                    help="file with the URLs to analyze, one per line ('-' \
+reads them from stdin, analyzing them as they are read unless '--checkpoint' \
+is used)")
+parser.add_argument("--watch", type=int, dest='watch', metavar='SECONDS',
+                    help="keep checking the URLs from '--urls' every SECONDS, \
+showing and saving only the changes in their analysis (until interrupted)")
+parser.add_argument("--worker", dest='worker', action="store_true",
+                    help="analyze the URLs from the '--queue' file, along \
+with other workers")
 
 args = parser.parse_args(args=None if sys.argv[1:] else ['--help'])
 
@@ -839,9 +4431,113 @@ if args.term:
     fng_analytics(term)
     sys.exit()
 
-if args.lang and not (args.URL or args.URL_A) and not args.guides:
+if args.lang and not (args.URL or args.URL_A or args.urls or args.worker
+                      or args.daemon or args.trends or args.diff) and \
+        not args.guides:
     parser.error("'-l' option requires also '-u' or '-a'.")
 
+if any([args.glob, args.domain, args.since, args.until]) and not args.URL_A:
+    parser.error("'--glob', '--domain', '--since' and '--until' options \
+requires also '-a'.")
+
+if (args.coordinator or args.worker) and not args.queue:
+    parser.error("'--coordinator' and '--worker' options requires also \
+'--queue'.")
+
+if args.connect and not args.URL:
+    parser.error("'--connect' option requires also '-u'.")
+
+if args.daemon and any([args.URL, args.urls, args.queue]):
+    parser.error("'--daemon' option can not be used with '-u', '--urls' or \
+'--queue'.")
+
+if (args.metrics or args.metrics_file) and \
+        not (args.urls or args.worker or args.daemon):
+    parser.error("'--metrics' and '--metrics-file' options requires also \
+'--urls', '--worker' or '--daemon'.")
+
+if args.coordinator and not args.urls:
+    parser.error("'--coordinator' option requires also '--urls'.")
+
+if (args.checkpoint or args.resume or args.watch) and not args.urls:
+    parser.error("'--checkpoint', '--resume' and '--watch' options requires \
+also '--urls'.")
+
+if (args.cache is not None or args.refresh or args.replay) and (
+        not args.URL or args.connect or args.gate or args.refresh and
+        args.replay):
+    parser.error("'--cache', '--refresh' and '--replay' options require \
+also '-u' (and can not be used with '--connect' or '--gate'; nor \
+'--refresh' with '--replay').")
+
+if args.async_f and (not args.urls or args.coordinator or args.watch):
+    parser.error("'--async' option requires also '--urls' (and can not be \
+used with '--coordinator' or '--watch').")
+
+if args.max_headers < 1 or args.max_length < 1:
+    parser.error("'--max-headers' and '--max-length' options requires N > \
+0.")
+
+if args.retries < 0:
+    parser.error("'--retries' option requires N >= 0.")
+
+if (args.deadline is not None and args.deadline <= 0) or \
+        (args.breaker is not None and args.breaker <= 0):
+    parser.error("'--deadline' and '--breaker' options requires SECONDS > 0.")
+
+if args.deadline and (not (args.urls or args.paths) or args.watch):
+    parser.error("'--deadline' option requires also '--urls' or '--paths' \
+(and can not be used with '--watch').")
+
+if args.breaker is not None and not any([args.urls, args.paths, args.gate,
+                                         args.worker, args.daemon]):
+    parser.error("'--breaker' option requires also '--urls', '--paths', \
+'--gate', '--worker' or '--daemon'.")
+
+if args.paths and (not args.URL or args.output or args.connect or args.gate
+                   or args.cache is not None or args.refresh or args.replay):
+    parser.error("'--paths' option requires also '-u' (and can not be used \
+with '-o', '--cache', '--connect', '--gate', '--refresh' or '--replay').")
+
+if args.gate and (not args.URL or args.output or args.connect):
+    parser.error("'--gate' option requires also '-u' (and can not be used \
+with '-o' or '--connect').")
+
+if args.report and (not args.urls or args.coordinator or args.watch or
+                    args.resume or args.output):
+    parser.error("'--report' option requires also '--urls' (and can not be \
+used with '-o', '--coordinator', '--resume' or '--watch').")
+
+if args.results and (not args.urls or args.coordinator or args.watch):
+    parser.error("'--results' option requires also '--urls' (and can not be \
+used with '--coordinator' or '--watch').")
+
+if args.trace and not any([args.urls, args.paths, args.worker]) or \
+        args.trace and args.coordinator:
+    parser.error("'--trace' option requires also '--urls', '--paths' or \
+'--worker' (and can not be used with '--coordinator').")
+
+if args.reanalyze and any([args.URL, args.urls, args.queue, args.daemon,
+                           args.diff, args.compact]):
+    parser.error("'--reanalyze' option can not be used with '-u', '--urls', \
+'--queue', '--daemon', '--diff' or '--compact'.")
+
+if args.diff and any([args.URL, args.urls, args.queue, args.daemon]):
+    parser.error("'--diff' option can not be used with '-u', '--urls', \
+'--queue' or '--daemon'.")
+
+if args.fleet and (not args.urls or args.coordinator or args.watch):
+    parser.error("'--fleet' option requires also '--urls' (and can not be \
+used with '--coordinator' or '--watch').")
+
+if args.resume and args.urls == '-' and not args.checkpoint:
+    parser.error("'--resume' option with '--urls -' requires also \
+'--checkpoint'.")
+
+if args.watch is not None and (args.watch < 1 or args.coordinator):
+    parser.error("'--watch' option requires SECONDS > 0 and can not be used \
+with '--coordinator'.")
+
 if any([args.brief, args.output, args.ret]) \
         and (args.URL is None or args.guides is None or args.URL_A is None):
     parser.error("'-b', -'o' and '-r' options requires also '-u'.")
@@ -854,6 +4550,17 @@ if args.guides:
     print_guides()
     sys.exit()
 
+if args.compact:
+    history_compact(get_compact(args.compact))
+    sys.exit()
+
+if args.trends or args.series:
+    if args.series:
+        history_series(args.series)
+    if args.trends:
+        trend_analytics()
+    sys.exit()
+
 if args.URL_A:
     if args.URL:
         url_analytics()
@@ -862,13 +4569,13 @@ if args.URL_A:
         url_analytics(is_global=True)
     sys.exit()
 
-start = time()
-print_ru_message()
-
-if not args.URL_A:
-    detail = '[analysis_output]' if args.output else '[analysis]'
-    print("")
-    print_detail(detail)
+# The daemon has already loaded the rest of the state (and checked the
+# country), so only the analysis is requested.
+if args.connect and not args.output:
+    print_w("")
+    print_detail('[analysis]')
+    if daemon_client(args.connect):
+        sys.exit()
 
 # Regarding 'dh key too small' errors: https://stackoverflow.com/a/41041028
 requests.packages.urllib3.util.ssl_.DEFAULT_CIPHERS += ':HIGH:!DH:!aNULL'
@@ -879,11 +4586,13 @@ except AttributeError:
     pass
 
 exception_d = {
+    requests.exceptions.ConnectTimeout: '[e_timeout]',
     requests.exceptions.ConnectionError: '[e_404]',
     requests.exceptions.InvalidSchema: '[e_schema]',
     requests.exceptions.InvalidURL: '[e_invalid]',
     requests.exceptions.MissingSchema: '[e_schema]',
     requests.exceptions.SSLError: None,
+    requests.exceptions.ReadTimeout: '[e_timeout]',
     requests.exceptions.Timeout: '[e_timeout]',
 }
 requests.packages.urllib3.disable_warnings()
@@ -891,29 +4600,29 @@ requests.packages.urllib3.disable_warnings()
 c_headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) \
 AppleWebKit/537.36 (KHTML, like Gecko) Chrome/114.0.0.0 Safari/537.36'}
 
-headers, status_code = request_exceptions()
-
-# Export analysis
-ext = "t.txt" if args.output in ['pdf', 'html'] else ".txt"
-
-if args.output:
-    orig_stdout = sys.stdout
-    name_s = tldextract.extract(URL)
-    name_sub = name_s.subdomain + '.' if name_s.subdomain else ''
-    name_dom = name_s.domain
-    name_tld = name_s.suffix
-    name_e = f"{name_sub}{name_dom}.{name_tld}_headers_{export_date}{ext}"
-    f = open(name_e, 'w', encoding='utf8')
-    sys.stdout = f
-
-print_summary()
-print_headers()
+dns_cache = {}
+dns_overrides = get_resolve(args.resolve)
+create_connection = requests.packages.urllib3.util.connection.create_connection
+requests.packages.urllib3.util.connection.create_connection = dns_connection
+session = get_session(args.concurrency)
+timeouts = get_timeouts(args.timeout)
+deadline_t = time() + args.deadline if args.deadline else 0
+breaker = CircuitBreaker(args.breaker) if args.breaker is not None else None
+tracer = Tracer(args.trace) if args.trace else None
+trace_lane = contextvars.ContextVar('trace_lane', default=None)
+if tracer:
+    ssl_wrap_socket = requests.packages.urllib3.connection.ssl_wrap_socket
+    requests.packages.urllib3.connection.ssl_wrap_socket = traced_tls
+async_tls = requests.packages.urllib3.util.ssl_.create_urllib3_context(
+    cert_reqs=ssl.CERT_NONE) if args.async_f else None
+l_rules = [line.rstrip('\n') for line in details_f if line.startswith('[')]
+rule_ids = {rule: rule_n for rule_n, rule in enumerate(l_rules)}
+rules_c, cached = None, False
+metrics = Metrics()
+if args.metrics:
+    metrics_server(args.metrics)
 
 # Report - 1. Missing HTTP Security Headers
-m_cnt = 0
-
-print_detail_r('[1missing]')
-
 l_miss = ['Cache-Control', 'Clear-Site-Data', 'Content-Type',
           'Cross-Origin-Embedder-Policy', 'Cross-Origin-Opener-Policy',
           'Cross-Origin-Resource-Policy', 'Content-Security-Policy', 'NEL',
@@ -924,75 +4633,34 @@ l_detail = ['[mcache]', '[mcsd]', '[mctype]', '[mcoe]', '[mcop]', '[mcor]',
             '[mcsp]', '[mnel]', '[mpermission]', '[mreferrer]', '[msts]',
             '[mxcto]', '[mxpcd]', '[mxfo]']
 
-missing_headers_lower = {k.lower(): v for k, v in headers.items()}
-
-for i, key in enumerate(l_miss):
-    if key.lower() not in missing_headers_lower:
-        print_header(key)
-        if not args.brief:
-            print_detail(l_detail[i], 2)
-        m_cnt += 1
-
-if not (headers.get('X-Frame-Options') or 'frame-ancestors' in
-        headers.get('Content-Security-Policy', '')):
-    print_header('X-Frame-Options')
-    if not args.brief:
-        print_detail("[mxfo]", 2)
-    m_cnt += 1
-
-if not any(elem.lower() in headers for elem in l_miss):
-    print_header('X-Frame-Options')
-    if not args.brief:
-        print_detail("[mxfo]", 2)
-    m_cnt += 1
-
-l_miss.append('X-Frame-Options')
-
-if args.brief and m_cnt != 0:
-    print("")
-
-if m_cnt == 0:
-    print_ok()
-
-print("")
-
 # Report - 2. Fingerprinting through headers/values
 
 # Certain content of the file 'fingerprint.txt' has been made possible by:
 #
 # OWASP Secure Headers Project
 # https://github.com/OWASP/www-project-secure-headers/blob/master/LICENSE.txt
-print_detail_r('[2fingerprint]')
-
-if not args.brief:
-    print_detail("[afgp]")
 
 l_fng, l_fng_ex = [], []
+fng_sigs = defaultdict(list)
 
 with open(path.join('additional', 'fingerprint.txt'), 'r', encoding='utf8') \
           as fn:
     for line in fn:
-        l_fng.append(line.partition(' [')[0].strip())
+        fng_h, _, fng_v = line.partition(' [')[0].partition(': ')
+        if fng_v:
+            fng_p = line.partition(' [')[2].strip()[:-1]
+            fng_sigs[fng_h.lower()].append((fng_v.strip(), fng_p))
+            continue
+        l_fng.append(fng_h.strip())
         l_fng_ex.append(line.strip())
 
-f_cnt = fingerprint_headers(headers, l_fng, l_fng_ex)
-
-if args.brief and f_cnt != 0:
-    print("")
-
-if f_cnt == 0:
-    print_ok()
-
-print("")
+# Value signatures of each header, e.g. 'Server: nginx{v} [Nginx]'.
+fng_values = {}
+for fng_h, l_sig in fng_sigs.items():
+    fng_values[fng_h] = (fingerprint_trie([sig for sig, _ in l_sig]),
+                         [prod for _, prod in l_sig])
 
 # Report - 3. Deprecated HTTP Headers/Protocols and Insecure values
-i_cnt = [0]
-
-print_detail_r('[3depinsecure]')
-
-if not args.brief:
-    print_detail("[aisc]")
-
 l_ins = ['Accept-CH', 'Access-Control-Allow-Methods',
          'Access-Control-Allow-Origin', 'Allow', 'Content-Type', 'Etag',
          'Expect-CT', 'Expires', 'Feature-Policy', 'Onion-Location', 'P3P',
@@ -1116,385 +4784,111 @@ l_robots = ['all', 'archive', 'follow', 'index', 'indexifembedded',
             'noindex', 'none', 'nopagereadaloud', 'nositelinkssearchbox',
             'nosnippet', 'notranslate', 'noydir', 'unavailable_after']
 
-if 'Accept-CH' in headers:
-    acceptch_header = headers['Accept-CH'].lower()
-    if URL.startswith(INS_S):
-        print_details('[ixach_h]', '[ixach]', 'd', i_cnt)
-    if 'sec-ch-ua-full-version' in acceptch_header:
-        print_detail_r('[ixachd_h]', is_red=True)
-        if not args.brief:
-            print_detail_l('[ixachd_s]')
-            print('sec-ch-ua-full-version')
-            print_detail('[ixachd]')
-        i_cnt[0] += 1
-
-if 'Accept-CH-Lifetime' in headers:
-    print_details('[ixacl_h]', '[ixacld]', 'd', i_cnt)
-
-accescred_header = headers.get("Access-Control-Allow-Credentials", '').lower()
-if accescred_header and accescred_header != 'true':
-    print_details('[icred_h]', '[icred]', 'd', i_cnt)
-
-if 'Access-Control-Allow-Methods' in headers:
-    methods = headers["Access-Control-Allow-Methods"]
-    if any(method in methods for method in l_methods):
-        print_detail_r('[imethods_h]', is_red=True)
-        if not args.brief:
-            match_method = [x for x in l_methods if x in methods]
-            match_method_str = ', '.join(match_method)
-            print_detail_l("[imethods_s]")
-            print(match_method_str)
-            print_detail("[imethods]")
-        i_cnt[0] += 1
-
-accesso_header = headers.get("Access-Control-Allow-Origin", '').lower()
-if accesso_header and ((accesso_header in ['*', 'null']) and
-                       (not any(val in accesso_header for
-                                val in ['.*', '*.']))):
-    print_details('[iaccess_h]', '[iaccess]', 'd', i_cnt)
-
-accesma_header = headers.get("Access-Control-Max-Age", '')
-if accesma_header and int(accesma_header) > 86400:
-    print_details('[iacessma_h]', '[iaccessma]', 'd', i_cnt)
-
-if 'Allow' in headers:
-    methods = headers["Allow"]
-    if any(method in methods for method in l_methods):
-        print_detail_r('[imethods_hh]', is_red=True)
-        if not args.brief:
-            match_method = [x for x in l_methods if x in methods]
-            match_method_str = ', '.join(match_method)
-            print_detail_l("[imethods_s]")
-            print(match_method_str)
-            print_detail("[imethods]")
-        i_cnt[0] += 1
-
-cache_header = headers.get("Cache-Control", '').lower()
-if cache_header and not any(elem in cache_header for elem in l_cachev):
-    print_details('[icachev_h]', '[icachev]', 'd', i_cnt)
-if cache_header and not all(elem in cache_header for elem in l_cache):
-    print_details('[icache_h]', '[icache]', 'd', i_cnt)
-
-if 'Clear-Site-Data' in headers:
-    clsdata_header = headers['Clear-Site-Data'].lower()
-    if URL.startswith(INS_S):
-        print_details('[icsd_h]', '[icsd]', 'd', i_cnt)
-    if not any(elem in clsdata_header for elem in l_csdata):
-        print_details('[icsdn_h]', '[icsdn]', 'd', i_cnt)
-
-cencod_header = headers.get("Content-Encoding", '').lower()
-if cencod_header and not any(elem in cencod_header for elem in l_cencoding):
-    print_details('[icencod_h]', '[icencod]', 'd', i_cnt)
-
-if 'Content-DPR' in headers:
-    print_details('[ixcdpr_h]', '[ixcdprd]', 'd', i_cnt)
-
-if 'Content-Security-Policy' in headers:
-    csp_h = headers['Content-Security-Policy'].lower()
-    if not any(elem in csp_h for elem in l_csp_dirs):
-        print_details('[icsi_h]', '[icsi]', 'd', i_cnt)
-    if ('=' in csp_h) and not (any(elem in csp_h for elem in l_csp_equal)):
-        print_details('[icsn_h]', '[icsn]', 'd', i_cnt)
-    csp_store_values(csp_h, l_csp_broad, l_csp_insecure, i_cnt)
-    if any(elem in csp_h for elem in ['unsafe-eval', 'unsafe-inline']):
-        print_details('[icsp_h]', '[icsp]', 'm', i_cnt)
-    if 'unsafe-hashes' in csp_h:
-        print_details('[icsu_h]', '[icsu]', 'd', i_cnt)
-    if "'nonce-" in csp_h:
-        nonces_csp = re.findall(r"'nonce-([^']+)'", csp_h)
-        for nonce_csp in nonces_csp:
-            if len(nonce_csp) < 32:
-                print_details('[icsnces_h]', '[icsnces]', 'd', i_cnt)
-                break
-    ip_mtch = re.findall(IP_PTRN, csp_h)
-    if ip_mtch != ['127.0.0.1']:
-        for match in ip_mtch:
-            if re.match(IP_PTRN, match):
-                print_details('[icsipa_h]', '[icsipa]', 'm', i_cnt)
-                break
-
-csp_ro_header = headers.get('Content-Security-Policy-Report-Only', '').lower()
-if csp_ro_header and any(elem in csp_ro_header for elem in l_csp_ro_dep):
-    print_detail_r('[icsiro_d]', is_red=True)
-    if not args.brief:
-        matches_csp_ro = [x for x in l_csp_ro_dep if x in csp_ro_header]
-        print_detail_l("[icsi_d_s]")
-        print(', '.join(matches_csp_ro))
-        print_detail("[icsiro_d_r]")
-    i_cnt[0] += 1
-
-ctype_header = headers.get('Content-Type', '').lower()
-if ctype_header:
-    if any(elem in ctype_header for elem in l_legacy):
-        print_details('[ictlg_h]', '[ictlg]', 'm', i_cnt)
-    if 'html' not in ctype_header:
-        print_details('[ictlhtml_h]', '[ictlhtml]', 'd', i_cnt)
-
-if 'Critical-CH' in headers and URL.startswith(INS_S):
-    print_details('[icrch_h]', '[icrch]', 'd', i_cnt)
-
-if 'Cross-Origin-Embedder-Policy' in headers:
-    coep_h = headers['Cross-Origin-Embedder-Policy'].lower()
-    if not any(elem in coep_h for elem in l_coep):
-        print_details('[icoep_h]', '[icoep]', 'd', i_cnt)
-
-if 'Cross-Origin-Opener-Policy' in headers:
-    coop_h = headers['Cross-Origin-Opener-Policy'].lower()
-    if not any(elem in coop_h for elem in l_coop):
-        print_details('[icoop_h]', '[icoop]', 'd', i_cnt)
-
-if 'Cross-Origin-Resource-Policy' in headers:
-    corp_h = headers['Cross-Origin-Resource-Policy'].lower()
-    if not any(elem in corp_h for elem in l_corp):
-        print_details('[icorp_h]', '[icorp]', 'd', i_cnt)
-
-if 'Digest' in headers:
-    print_details('[idig_h]', '[idig]', 'd', i_cnt)
-
-if 'Etag' in headers:
-    print_details('[ieta_h]', '[ieta]', 'd', i_cnt)
-
-if 'Expect-CT' in headers:
-    print_details('[iexct_h]', '[iexct]', 'm', i_cnt)
-
-if 'Expires' in headers and any(elem in headers.get('Cache-Control', '') for
-                                elem in l_excc):
-    print_details('[iexpi_h]', '[iexpi]', 'd', i_cnt)
-
-if 'Feature-Policy' in headers:
-    print_details('[iffea_h]', '[iffea]', 'd', i_cnt)
-
-if URL.startswith(INS_S):
-    print_details('[ihttp_h]', '[ihttp]', 'd', i_cnt)
-
-if ('Keep-Alive' in headers and headers['Keep-Alive'] and
-    ('Connection' not in headers or
-     headers['Connection'].lower() != 'keep-alive')):
-    print_details('[ickeep_h]', '[ickeep]', 'd', i_cnt)
-
-if 'Large-Allocation' in headers:
-    print_details('[ixlalloc_h]', '[ixallocd]', 'd', i_cnt)
-
-if 'Onion-Location' in headers:
-    print_details('[ionloc_h]', '[ionloc]', 'm', i_cnt)
-
-if 'P3P' in headers:
-    print_details('[ip3p_h]', '[ip3p]', 'd', i_cnt)
-
-if 'Permissions-Policy' in headers:
-    perm_header = headers['Permissions-Policy'].lower()
-    if not any(elem in perm_header for elem in l_per_dirs):
-        print_details('[ifpoln_h]', '[ifpoln]', 'm', i_cnt)
-    if '*' in perm_header:
-        print_details('[ifpol_h]', '[ifpol]', 'd', i_cnt)
-    if 'none' in perm_header:
-        print_details('[ifpoli_h]', '[ifpoli]', 'd', i_cnt)
-    if 'document-domain' in perm_header:
-        print_detail_r('[ifpold_h]', is_red=True)
-        if not args.brief:
-            print_detail_l('[ifpold_s]')
-            print('document-domain')
-            print_detail('[ifpold]')
-        i_cnt[0] += 1
-
-if 'Pragma' in headers:
-    print_details('[iprag_h]', '[iprag]', 'd', i_cnt)
-
-if 'Public-Key-Pins' in headers:
-    print_details('[ipkp_h]', '[ipkp]', 'd', i_cnt)
-
-if 'Public-Key-Pins-Report-Only' in headers:
-    print_details('[ipkpr_h]', '[ipkp]', 'd', i_cnt)
-
-referrer_header = headers.get('Referrer-Policy', '').lower()
-if referrer_header:
-    if not any(elem in referrer_header for elem in l_ref_secure):
-        print_details('[iref_h]', '[iref]', 'm', i_cnt)
-    if 'unsafe-url' in referrer_header:
-        print_details('[irefi_h]', '[irefi]', 'd', i_cnt)
-    if not any(elem in referrer_header for elem in l_ref_values):
-        print_details('[irefn_h]', '[irefn]', 'd', i_cnt)
-
-if 'Server-Timing' in headers:
-    print_details('[itim_h]', '[itim]', 'd', i_cnt)
-
-ck_header = headers.get("Set-Cookie", '').lower()
-if ck_header:
-    if not (URL.startswith(INS_S)) and not all(elem in ck_header for elem in
-                                               ('secure', 'httponly')):
-        print_details("[iset_h]", "[iset]", "d", i_cnt)
-    if (URL.startswith(INS_S)) and ('secure' in ck_header):
-        print_details("[iseti_h]", "[iseti]", "d", i_cnt)
-    if "samesite=none" in ck_header and "secure" not in ck_header:
-        print_details("[iseti_m]", "[isetm]", "d", i_cnt)
-
-if 'Strict-Dynamic' in headers:
-    print_details('[isdyn_h]', '[isdyn]', 'd', i_cnt)
-
-sts_header = headers.get('Strict-Transport-Security', '').lower()
-if (sts_header) and not (URL.startswith(INS_S)):
-    age = int(''.join(filter(str.isdigit, sts_header)))
-    if not all(elem in sts_header for elem in ('includesubdomains',
-       'max-age')) or (age is None or age < 31536000):
-        print_details('[ists_h]', '[ists]', 'm', i_cnt)
-    if ',' in sts_header:
-        print_details('[istsd_h]', '[istsd]', 'd', i_cnt)
-
-if (sts_header) and (URL.startswith(INS_S)):
-    print_details('[ihsts_h]', '[ihsts]', 'd', i_cnt)
-
-if headers.get('Timing-Allow-Origin', '') == '*':
-    print_details('[itao_h]', '[itao]', 'd', i_cnt)
-
-if 'Tk' in headers:
-    print_details('[ixtk_h]', '[ixtkd]', 'd', i_cnt)
-
-if 'Trailer' in headers:
-    trailer_h = headers['Trailer'].lower()
-    if any(elem in trailer_h for elem in l_trailer):
-        print_detail_r('[itrailer_h]', is_red=True)
-        if not args.brief:
-            matches_trailer = [x for x in l_trailer if x in trailer_h]
-            print_detail_l("[itrailer_d_s]")
-            print(', '.join(matches_trailer))
-            print_detail("[itrailer_d_r]")
-        i_cnt[0] += 1
-
-if 'Transfer-Encoding' in headers:
-    transfer_h = headers['Transfer-Encoding'].lower()
-    if not any(elem in transfer_h for elem in l_transfer):
-        print_details('[ictrf_h]', '[itrf]', 'd', i_cnt)
-
-if 'Warning' in headers:
-    print_details('[ixwar_h]', '[ixward]', 'd', i_cnt)
-
-wwwa_header = headers.get('WWW-Authenticate', '').lower()
-if (wwwa_header) and (URL.startswith(INS_S)) and ('basic' in wwwa_header):
-    print_details('[ihbas_h]', '[ihbas]', 'd', i_cnt)
-
-if 'X-Content-Security-Policy' in headers:
-    print_details('[ixcsp_h]', '[ixcsp]', 'd', i_cnt)
-
-if 'X-Content-Security-Policy-Report-Only' in headers:
-    print_details('[ixcspr_h]', '[ixcspr]', 'd', i_cnt)
-
-if 'X-Content-Type-Options' in headers:
-    if ',' in headers['X-Content-Type-Options']:
-        print_details('[ictpd_h]', '[ictpd]', 'd', i_cnt)
-    elif 'nosniff' not in headers['X-Content-Type-Options']:
-        print_details('[ictp_h]', '[ictp]', 'd', i_cnt)
-
-if headers.get('X-DNS-Prefetch-Control', '') == 'on':
-    print_details('[ixdp_h]', '[ixdp]', 'd', i_cnt)
-
-if 'X-Download-Options' in headers:
-    print_details('[ixdow_h]', '[ixdow]', 'm', i_cnt)
-
-xfo_header = headers.get('X-Frame-Options', '').lower()
-if xfo_header:
-    if ',' in xfo_header:
-        print_details('[ixfo_h]', '[ixfo]', 'm', i_cnt)
-    if 'allow-from' in xfo_header:
-        print_details('[ixfod_h]', '[ixfod]', 'm', i_cnt)
-    if xfo_header not in ['deny', 'sameorigin']:
-        print_details('[ixfoi_h]', '[ixfodi]', 'm', i_cnt)
-
-if 'X-Pad' in headers:
-    print_details('[ixpad_h]', '[ixpad]', 'd', i_cnt)
-
-if headers.get('X-Permitted-Cross-Domain-Policies', '') == 'all':
-    print_details('[ixcd_h]', '[ixcd]', 'm', i_cnt)
-
-if headers.get('X-Pingback', '').endswith('xmlrpc.php'):
-    print_details('[ixpb_h]', '[ixpb]', 'd', i_cnt)
-
-robots_header = headers.get('X-Robots-Tag', '').lower()
-if robots_header:
-    if not any(elem in robots_header for elem in l_robots):
-        print_details('[ixrobv_h]', '[ixrobv]', 'm', i_cnt)
-    if 'all' in robots_header:
-        print_details('[ixrob_h]', '[ixrob]', 'm', i_cnt)
-
-if 'X-Runtime' in headers:
-    print_details('[ixrun_h]', '[ixrun]', 'd', i_cnt)
-
-if 'X-SourceMap' in headers:
-    print_details('[ixsrc_h]', '[ixsrc]', 'd', i_cnt)
-
-if 'X-UA-Compatible' in headers:
-    print_details('[ixuacom_h]', '[ixuacom]', 'm', i_cnt)
-
-if 'X-Webkit-CSP' in headers:
-    print_details('[ixwcsp_h]', '[ixcsp]', 'd', i_cnt)
+# Report - 5. Browser Compatibility for Enabled HTTP Security Headers
+l_sec = ['Cache-Control', 'Clear-Site-Data', 'Content-Type',
+         'Content-Security-Policy', 'Cross-Origin-Embedder-Policy',
+         'Cross-Origin-Opener-Policy', 'Cross-Origin-Resource-Policy', 'NEL',
+         'Permissions-Policy', 'Referrer-Policy', 'Strict-Transport-Security',
+         'X-Content-Type-Options', 'X-Frame-Options']
 
-if 'X-Webkit-CSP-Report-Only' in headers:
-    print_details('[ixwcspr_h]', '[ixcspr]', 'd', i_cnt)
+fleet = FleetReport() if args.fleet else None
+report_c = ConsolidatedReport(args.report) if args.report else None
+results_r = RunResults(args.results, args.resume) if args.results else None
 
-if 'X-XSS-Protection' in headers:
-    if '0' not in headers["X-XSS-Protection"]:
-        print_details('[ixxp_h]', '[ixxp]', 'd', i_cnt)
-    if ',' in headers['X-XSS-Protection']:
-        print_details('[ixxpd_h]', '[ixxpd]', 'd', i_cnt)
+snaps = SnapshotStore() if args.urls or args.worker else None
 
-if args.brief and i_cnt[0] != 0:
-    print("")
+if args.diff:
+    diff_analysis(*args.diff)
+    sys.exit()
 
-if i_cnt[0] == 0:
-    print_ok()
+if args.reanalyze:
+    history_reanalyze()
+    sys.exit()
+# The sections are written as in the exports ('-o').
+args.output = report_c.fmt if report_c else args.output
+
+if args.daemon:
+    print_ru_message()
+    daemon_lock = threading.Lock()
+    details_d = {args.lang: details_f}
+    daemon_analysis(args.daemon, args.concurrency)
+    sys.exit()
 
-print("")
+if args.coordinator or args.worker:
+    print_ru_message()
+    if args.coordinator:
+        queue_coordinator(args.queue, args.urls, args.lease)
+    else:
+        try:
+            queue_worker(args.queue, args.lease)
+        finally:
+            trace_close()
+    sys.exit()
 
-# Report - 4. Empty HTTP Response Headers Values
-e_cnt = 0
-empty_s_headers = sorted(headers)
-l_empty = []
-print_detail_r('[4empty]')
+if args.urls:
+    print_ru_message()
+    limiter = RateLimiter(args.concurrency, args.rate, args.rate_ip)
+    checkpoint_file = args.checkpoint or f"{args.urls}.checkpoint"
+    try:
+        if args.watch:
+            watch_analysis(args.urls, checkpoint_file, limiter, args.watch)
+        elif args.urls == '-' and not (args.checkpoint or args.resume):
+            stream_analysis(args.urls, limiter)
+        else:
+            batch_analysis(args.urls, checkpoint_file, limiter, args.resume,
+                           args.retry)
+    finally:
+        if report_c:
+            report_c.discard()
+        trace_close()
+    sys.exit()
 
-if not args.brief:
-    print_detail("[aemp]")
+if args.paths:
+    print_ru_message()
+    try:
+        sweep_analysis(URL, args.paths, RateLimiter(args.concurrency,
+                                                    args.rate, args.rate_ip))
+    finally:
+        trace_close()
+    sys.exit()
 
-for key in empty_s_headers:
-    if not headers[key]:
-        l_empty.append("_" + key)
-        print_header(key)
-        e_cnt += 1
+if args.gate:
+    print_ru_message()
+    gate_analysis(URL, *get_gate(args.gate))
 
-print("") if e_cnt != 0 else print_ok()
-print("")
+start = time()
+print_ru_message()
 
-# Report - 5. Browser Compatibility for Enabled HTTP Security Headers
-print_detail_r('[5compat]')
+if not args.URL_A:
+    detail = '[analysis_output]' if args.output else '[analysis]'
+    print_w("")
+    print_detail(detail)
 
-l_sec = ['Cache-Control', 'Clear-Site-Data', 'Content-Type',
-         'Content-Security-Policy', 'Cross-Origin-Embedder-Policy',
-         'Cross-Origin-Opener-Policy', 'Cross-Origin-Resource-Policy', 'NEL',
-         'Permissions-Policy', 'Referrer-Policy', 'Strict-Transport-Security',
-         'X-Content-Type-Options', 'X-Frame-Options']
+if args.cache is not None or args.refresh or args.replay:
+    headers, status_code, cached = cache_request()
+else:
+    headers, status_code = request_exceptions()
 
-header_matches = [header for header in l_sec if header in headers]
+# Export analysis
+ext = "t.txt" if args.output in ['pdf', 'html'] else ".txt"
 
-if header_matches:
-    for key in header_matches:
-        output_string = "  " if args.output == 'html' else " "
-        key_string = key if args.output else Fore.CYAN + key + Fore.RESET
-        print(f"{output_string}{key_string}{CAN_S}\
-{key.replace('Content-Security-Policy', 'contentsecuritypolicy2')}")
-else:
-    print_detail_l("[bcompat_n]") if args.output else \
-        print_detail_r("[bcompat_n]", is_red=True)
+report_w = tty_w
+if args.output:
+    name_s = tldextract.extract(URL)
+    name_sub = name_s.subdomain + '.' if name_s.subdomain else ''
+    name_dom = name_s.domain
+    name_tld = name_s.suffix
+    name_e = f"{name_sub}{name_dom}.{name_tld}_headers_{export_date}{ext}"
+    report_w = FileWriter(name_e)
 
-print(linesep.join(['']*2))
-end = time()
-analysis_time()
+with report_writer(report_w):
+    analysis_report()
+report_w.close()
 
 # Export analysis
 if args.output == 'txt':
-    sys.stdout = orig_stdout
     print_path(name_e)
-    f.close()
 elif args.output == 'pdf':
-    sys.stdout = orig_stdout
-    f.close()
     pdf = PDF()
     pdf.alias_nb_pages()
     pdf_metadata()
@@ -1503,102 +4897,22 @@ elif args.output == 'pdf':
 
     # PDF Body
     pdf.set_font("Courier", size=9)
-    f = open(name_e, "r", encoding='utf8')
-    links_strings = (URL_S, REF_E, REF_S, CAN_S)
-
-    for x in f:
-        if '[' in x:
-            pdf_sections()
-        pdf.set_font(style='B' if any(s in x for s in BOLD_S) else '')
-        for string in links_strings:
-            if string in x:
-                pdf_links(string)
-        pdf.set_text_color(0, 0, 0)
-        pdf.multi_cell(197, 2.6, txt=x, align='L')
+    with open(name_e, "r", encoding='utf8') as f:
+        pdf_lines(f)
 
     name_p = f"{name_e[:-5]}.pdf"
     pdf.output(name_p)
     print_path(name_p)
-    f.close()
     remove(name_e)
 elif args.output == 'html':
-    sys.stdout = orig_stdout
-    f.close()
-
-    # HTML Template
-    title = get_detail('[pdf_s]')
-    header = f'<!DOCTYPE HTML><html lang="en"><head><meta charset="utf-8">\
-<title>{title}</title><style>pre {{overflow-x: auto; white-space: \
-pre-wrap;white-space: -moz-pre-wrap; white-space: -pre-wrap;white-space: \
--o-pre-wrap; word-wrap: break-word; font-size: medium;}} a {{color: blue; \
-text-decoration: none;}} .ok {{color: green;}} .header {{color: #660033;}} \
-.ko {{color: red;}} </style></head>'
-    body = '<body><pre>'
-    footer = '</pre></body></html>'
-
     name_p = f"{name_e[:-5]}.html"
-    l_miss.extend(['Pragma', 'WWW-Authenticate', 'X-Frame-Options',
-                   'X-Robots-Tag', 'X-UA-compatible'])
-    l_final = sorted(l_miss + l_ins)
-    l_fng_final = sorted(l_fng)
 
     with open(name_e, 'r', encoding='utf8') as input_file,\
             open(name_p, 'w', encoding='utf8') as output:
-        output.write(str(header))
-        output.write(str(body))
-
-        sub_d = {'ahref_f': '</a>', 'ahref_s': '<a href="', 'close_t': '">',
-                 'span_ko': '<span class="ko">', 'span_h':
-                 '<span class="header">', 'span_f': '</span>'}
-
-        for ln in input_file:
-            if 'rfc-st' in ln:
-                output.write(f"{ln[:2]}{sub_d['ahref_s']}{ln[2:-2]}\
-                             {sub_d['close_t']}{ln[2:]}{sub_d['ahref_f']}")
-            elif ' URL  : ' in ln:
-                output.write(f"{ln[:7]}{sub_d['ahref_s']}{ln[7:]}\
-                             {sub_d['close_t']}{ln[7:]}{sub_d['ahref_f']}")
-            elif any(s in ln for s in BOLD_S):
-                output.write(f'<strong>{ln}</strong>')
-            elif get_detail('[ok]') in ln:
-                output.write(f'<span class="ok">{ln}{sub_d["span_f"]}')
-            elif get_detail('[bcompat_n]') in ln:
-                output.write(f"{sub_d['span_ko']}{ln}{sub_d['span_f']}")
-            elif ' Ref: ' in ln:
-                output.write(f"{ln[:6]}{sub_d['ahref_s']}{ln[6:]}\
-                             {sub_d['close_t']}{ln[6:]}{sub_d['ahref_f']}")
-            elif ' Ref  : ' in ln:
-                output.write(f"{ln[:6]}{sub_d['ahref_s']}{ln[8:]}\
-                             {sub_d['close_t']}{ln[6:]}{sub_d['ahref_f']}")
-            elif 'caniuse' in ln:
-                ln = f"{sub_d['span_h']}{ln[1:ln.index(': ')]}: \
-{sub_d['span_f']}{sub_d['ahref_s']}{ln[ln.index(SEC_S):]}{sub_d['close_t']}\
-{ln[ln.index(SEC_S):]}{sub_d['ahref_f']}"
-                output.write(ln)
-            else:
-                for i in headers:
-                    if (str(i + ": ") in ln) and ('Date:   ' not in ln):
-                        ln = ln.replace(ln[0: ln.index(":")], sub_d['span_h'] +
-                                        ln[0: ln.index(":")] + sub_d['span_f'])
-                for i in l_fng_final:
-                    if i in ln and not args.brief:
-                        try:
-                            idx = ln.index(' [')
-                        except ValueError:
-                            continue
-                        ln = f"{sub_d['span_ko']}{ln[:idx]}{sub_d['span_f']}\
-{ln[idx:]}"
-                    elif i in ln and args.brief:
-                        ln = f"{sub_d['span_ko']}{ln}{sub_d['span_f']}"
-                for i in l_final:
-                    if (i in ln) and ('"' not in ln) or ('HTTP (' in ln):
-                        ln = ln.replace(ln, sub_d['span_ko'] +
-                                        ln + sub_d['span_f'])
-                for i in l_empty:
-                    if i[1:] in ln:
-                        ln = f"{sub_d['span_ko']}{ln}{sub_d['span_f']}"
-                output.write(ln)
-        output.write(footer)
+        output.write(html_header())
+        output.write('<body><pre>')
+        html_lines(input_file, output, headers, l_empty)
+        output.write('</pre></body></html>')
 
     print_path(name_p)
     remove(name_e)